@@ -0,0 +1,139 @@
+import argparse
+import glob
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Union
+
+import pandas as pd
+
+from instrumentation import StageRecorder
+from main import run_pipeline, setup_logging
+from opportunities import analyze_composability
+from report import ReportWriter
+from streaming import StreamingStats
+
+DEFAULT_OUTPUT_ROOT = Path('output/multi-chain')
+
+def discover_chain_files(source: Union[str, Path]) -> List[Path]:
+    """CSV exports in a directory, or the files matching a glob pattern; the file stem names the chain"""
+    source_path = Path(source)
+    if source_path.is_dir():
+        return sorted(source_path.glob('*.csv'))
+    return sorted(Path(path) for path in glob.glob(str(source)))
+
+def analyze_chain(csv_path: Path, output_root: Path) -> dict:
+    """Run the full single-chain report and return the chain's partial aggregates"""
+    chain = csv_path.stem
+    base_output_dir = output_root / chain
+    charts_dir = base_output_dir / 'charts'
+    charts_dir.mkdir(parents=True, exist_ok=True)
+
+    recorder = StageRecorder()
+    try:
+        with recorder.activate():
+            # Charts render serially: the batch pool already keeps every core busy
+            df = run_pipeline(csv_path, base_output_dir, charts_dir, chart_workers=1)
+        aggregates = StreamingStats()
+        aggregates.update(df)
+        # Exact per-chain medians for the Chains table; the frame is already in memory
+        aggregates.finalize_medians([df])
+        composability = analyze_composability(df)[['Category', 'Subcategory', 'Total_TVL', 'Protocol_Count']]
+        return {
+            'chain':         chain,
+            'status':        'ok',
+            'aggregates':    aggregates,
+            'composability': composability.astype({'Category': str, 'Subcategory': str}),
+            'output_dir':    base_output_dir
+        }
+    except Exception as e:
+        logging.error(f"Chain {chain} failed: {str(e)}")
+        return {'chain': chain, 'status': 'error', 'error': str(e)}
+    finally:
+        recorder.write_json(base_output_dir / 'metrics.json')
+
+def read_chain_tvl(output_dir: Path) -> pd.DataFrame:
+    """A chain's cleaned TVL column, from the Parquet copy when it was written (pyarrow is optional)"""
+    parquet_path = output_dir / 'cleaned_data.parquet'
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path, columns=['tvl'])
+    return pd.read_csv(output_dir / 'cleaned_data.csv', usecols=['tvl'])
+
+def merge_chain_results(results: List[dict]) -> dict:
+    """Cross-chain summary from per-chain partials, without concatenating raw frames"""
+    succeeded = [result for result in results if result['status'] == 'ok']
+    merged = StreamingStats()
+    for result in succeeded:
+        merged.merge(result['aggregates'])
+
+    # Medians need values: read back only each chain's TVL column, one chain at a time
+    merged.finalize_medians(read_chain_tvl(result['output_dir']) for result in succeeded)
+
+    composability = pd.concat([result['composability'] for result in succeeded], ignore_index=True) \
+        if succeeded else pd.DataFrame(columns=['Category', 'Subcategory', 'Total_TVL', 'Protocol_Count'])
+    composability = composability.groupby(['Category', 'Subcategory'], as_index=False).sum()
+    composability['Avg_TVL'] = composability['Total_TVL'] / composability['Protocol_Count']
+
+    chains = pd.DataFrame([
+        {'Chain': result['chain'], **result['aggregates'].report()} for result in succeeded
+    ])
+    return {
+        'stats':         merged.report(),
+        'chains':        chains,
+        'composability': composability.sort_values('Total_TVL', ascending=False),
+        'top_protocols': merged.top_protocols(),
+        'failed':        {result['chain']: result['error'] for result in results if result['status'] == 'error'}
+    }
+
+def write_summary(summary: dict, output_root: Path):
+    """Write summary.md and a machine-readable summary.json"""
+    with ReportWriter(output_root / 'summary', 'Cross-Chain DeFi Opportunities Summary', formats=('md',)) as report:
+        report.heading("Statistics")
+        report.stats(summary['stats'])
+        report.heading("Chains")
+        report.table(summary['chains'])
+        report.heading("Top Protocols")
+        report.table(summary['top_protocols'])
+        report.heading("Composability")
+        report.table(summary['composability'].head(20))
+        if summary['failed']:
+            report.heading("Failed Chains")
+            report.stats(summary['failed'])
+
+    (output_root / 'summary.json').write_text(json.dumps({
+        'stats':         summary['stats'],
+        'chains':        summary['chains'].to_dict(orient='records'),
+        'top_protocols': summary['top_protocols'].to_dict(orient='records'),
+        'composability': summary['composability'].to_dict(orient='records'),
+        'failed':        summary['failed']
+    }, indent=2, default=str))
+
+def run_batch(source: Union[str, Path], output_root: Path = DEFAULT_OUTPUT_ROOT, workers: int = None) -> dict:
+    """Analyze every chain export in parallel and write per-chain reports plus one merged summary"""
+    csv_paths = discover_chain_files(source)
+    if not csv_paths:
+        raise FileNotFoundError(f"No chain exports found for {source}")
+    output_root.mkdir(parents=True, exist_ok=True)
+    logging.info(f"Analyzing {len(csv_paths)} chains with {workers or 'one per CPU'} workers")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=setup_logging) as pool:
+        results = list(pool.map(analyze_chain, csv_paths, [output_root] * len(csv_paths)))
+
+    summary = merge_chain_results(results)
+    write_summary(summary, output_root)
+    logging.info(f"Batch complete! Check {output_root / 'summary.md'} for the cross-chain summary.")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the DeFi analyzer over many chain exports')
+    parser.add_argument('source', help='Directory of chain CSVs or a glob such as "exports/*.csv"')
+    parser.add_argument('--output', type=Path, default=DEFAULT_OUTPUT_ROOT)
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    run_batch(args.source, args.output, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from charts import CHARTS, ChartGenerator, clean_dataframe
+from main import setup_logging
+from function_analysis import classify_function, standardize_functions
+from opportunities import analyze_composability, calculate_yield_potential, find_composability_opportunities
+from stats import generate_stats_report
+
+# Phrases the function classifier recognizes, plus some it does not
+FUNCTION_PHRASES = [
+    'Stake SOL', 'Liquid staking', 'Swap tokens', 'Trade with leverage', 'Trade perps',
+    'Buy options', 'Yield farm', 'Provide liquidity', 'Earn yield', 'Borrow stablecoins',
+    'Lend assets', 'Margin trading', 'Vote in governance', 'Buy insurance', 'Join launchpad sales',
+    'Mint NFTs', 'Bridge assets', 'Create a wallet'
+]
+
+DEFAULT_SCALE = {
+    'protocols':          10_000,
+    'categories':         20,
+    'subcategories':      5,
+    'function_fragments': 4,
+    'tvl_skew':           2.5,
+    'zero_tvl_share':     0.02,
+    'seed':               0
+}
+
+def generate_synthetic_dataset(protocols: int = 10_000, categories: int = 20, subcategories: int = 5,
+                               function_fragments: int = 4, tvl_skew: float = 2.5,
+                               zero_tvl_share: float = 0.02, seed: int = 0) -> pd.DataFrame:
+    """Build a solana.csv-shaped frame.
+
+    subcategories is per category, function_fragments is the number of phrases per
+    protocol and tvl_skew is the sigma of the log-normal TVL distribution.
+    """
+    rng = np.random.default_rng(seed)
+    category_ids = rng.integers(0, categories, protocols)
+    subcategory_ids = rng.integers(0, subcategories, protocols)
+
+    tvl = rng.lognormal(mean=14, sigma=tvl_skew, size=protocols)
+    tvl_text = pd.Series([f'${value:,.2f}' for value in tvl])
+    tvl_text[rng.random(protocols) < zero_tvl_share] = ''
+
+    phrases = np.array(FUNCTION_PHRASES, dtype=object)
+    picks = rng.integers(0, len(phrases), (protocols, function_fragments))
+    fragments = [list(row) for row in phrases[picks]]
+
+    return pd.DataFrame({
+        'Protocol':               [f'Protocol {i}' for i in range(protocols)],
+        'Category':               [f'Category {i}' for i in category_ids],
+        'Subcategory':            [f'Category {c} / Sub {s}' for c, s in zip(category_ids, subcategory_ids)],
+        'TVL':                    tvl_text,
+        'Function':               ['\n'.join(row) for row in fragments],
+        'What can be done today': [', '.join(row) for row in fragments]
+    })
+
+def measure(func, repeat: int = 3, setup=None) -> dict:
+    """Wall time over repeat runs plus the tracemalloc peak of one extra run; setup runs untimed before each"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'min_s':        min(timings),
+        'median_s':     statistics.median(timings),
+        'peak_mem_mb':  peak / 2**20
+    }
+
+def run_benchmarks(scale: dict, repeat: int = 3, pair_top_k: int = 100) -> dict:
+    """Benchmark every analyzer stage against one synthetic dataset"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        csv_path = tmp / 'solana.csv'
+        generate_synthetic_dataset(**scale).to_csv(csv_path, index=False)
+
+        df = clean_dataframe(csv_path, use_cache=False)
+        composability = calculate_yield_potential(analyze_composability(df))
+
+        stages = {
+            'clean_dataframe':                  lambda: clean_dataframe(csv_path, use_cache=False),
+            'generate_stats_report':            lambda: generate_stats_report(df),
+            'analyze_composability':            lambda: analyze_composability(df),
+            'find_composability_opportunities': lambda: find_composability_opportunities(
+                composability.copy(), top_k=pair_top_k),
+            'standardize_functions':            lambda: standardize_functions(df, tmp)
+        }
+        # Cold runs, as in a pipeline run: a warm classify_function cache would hide the classification cost
+        setups = {'standardize_functions': classify_function.cache_clear}
+        chart_gen = ChartGenerator(df.copy(), tmp, use_cache=False)
+        for method_name in CHARTS.values():
+            stages[f'ChartGenerator.{method_name}'] = getattr(chart_gen, method_name)
+
+        for name, func in stages.items():
+            logging.info(f"Benchmarking {name}...")
+            results[name] = measure(func, repeat, setups.get(name))
+
+    return results
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def find_regressions(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Stages whose median time or peak memory grew by more than tolerance over the baseline"""
+    regressions = []
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for metric in ('median_s', 'peak_mem_mb'):
+            if previous[metric] > 0 and result[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{name} {metric}: {previous[metric]:.4f} -> {result[metric]:.4f} "
+                    f"(+{(result[metric] / previous[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DeFi analyzers on synthetic data')
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pair-top-k', type=int, default=100)
+    parser.add_argument('--output', type=Path, default=Path('benchmark_results.json'))
+    parser.add_argument('--compare', type=Path, help='Earlier results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging()
+    scale = {name: getattr(args, name) for name in DEFAULT_SCALE}
+
+    report = {
+        'commit':     git_commit(),
+        'timestamp':  time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python':     platform.python_version(),
+        'pandas':     pd.__version__,
+        'numpy':      np.__version__,
+        'scale':      scale,
+        'repeat':     args.repeat,
+        'results':    run_benchmarks(scale, args.repeat, args.pair_top_k)
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    logging.info(f"Saved benchmark results to {args.output}")
+
+    if args.compare:
+        regressions = find_regressions(report, json.loads(args.compare.read_text()), args.tolerance)
+        for regression in regressions:
+            logging.warning(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
+import hashlib
+import json
+import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from matplotlib.ticker import FuncFormatter
 from seaborn import set_style, color_palette
 import logging
 from pathlib import Path
-
-# Move logging config to top
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+from instrumentation import StageRecorder, record_stage, stage
+from loader import ensure_dataframe, load_dataset
+from stats import TVL_BIN_EDGES, TVL_BIN_RANGES
+from tvl_index import TVLIndex
 
 # Add configuration constants
 CHART_CONFIG = {
@@ -24,6 +29,16 @@ CHART_CONFIG = {
     }
 }
 
+# Style applied on top of CHART_CONFIG['style']; part of every chart cache key
+SEABORN_STYLE = 'whitegrid'
+PLOT_RC_PARAMS = {
+    'font.size':         12,
+    'axes.titlesize':    16,
+    'axes.labelsize':    14,
+    'figure.facecolor':  'white',
+    'axes.facecolor':    'white'
+}
+
 # Add this function before the ChartGenerator class
 def millions_formatter(x, pos):
     """Format large numbers into millions (M), billions (B), or trillions (T)"""
@@ -40,59 +55,86 @@ def millions_formatter(x, pos):
 class ChartGenerator:
     """Class to handle chart generation with shared configuration"""
     
-    def __init__(self, df, output_dir: Path):
-        self.df                = df
-        self.df['category']    = self.df['category'].astype('category')
+    def __init__(self, df, output_dir: Path, use_cache: bool = True):
+        # Never mutate the caller's frame; the loader already supplies a categorical
+        self.df                = df if isinstance(df['category'].dtype, pd.CategoricalDtype) \
+                                 else df.assign(category=df['category'].astype('category'))
         self.output_dir        = output_dir
+        self.use_cache         = use_cache
+        self.index             = TVLIndex(self.df)
         self.setup_plot_style()
     
     @staticmethod
     def setup_plot_style():
         """Set consistent style for all charts"""
         plt.style.use(CHART_CONFIG['style'])
-        set_style("whitegrid")  # Use specific seaborn function
-        plt.rcParams.update({
-            'font.size':         12,
-            'axes.titlesize':    16,
-            'axes.labelsize':    14,
-            'figure.facecolor':  'white',
-            'axes.facecolor':    'white'
-        })
-    
-    def save_figure(self, filename):
+        set_style(SEABORN_STYLE)  # Use specific seaborn function
+        plt.rcParams.update(PLOT_RC_PARAMS)
+    
+    @staticmethod
+    def cache_key(filename, *inputs):
+        """Hash of a chart's input slice together with the chart config and style"""
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [filename, CHART_CONFIG, SEABORN_STYLE, PLOT_RC_PARAMS], sort_keys=True, default=str
+        ).encode())
+        for value in inputs:
+            if isinstance(value, (pd.DataFrame, pd.Series)):
+                value = value.to_csv()
+            elif isinstance(value, np.ndarray):
+                value = value.tobytes()
+            digest.update(value if isinstance(value, bytes) else repr(value).encode())
+        return digest.hexdigest()
+    
+    def _key_path(self, filename):
+        return self.output_dir / f'.{filename}.key'
+    
+    def is_cached(self, filename, key):
+        """True when filename was already rendered from inputs with the same key"""
+        key_path = self._key_path(filename)
+        return (self.use_cache and (self.output_dir / filename).exists()
+                and key_path.exists() and key_path.read_text() == key)
+    
+    def save_figure(self, fig, filename, key=None):
         """Centralized figure saving with consistent parameters"""
         output_path = self.output_dir / filename
-        plt.tight_layout()
-        plt.savefig(output_path, dpi=CHART_CONFIG['dpi'], 
-                   bbox_inches='tight', facecolor='white')
-        plt.close()
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=CHART_CONFIG['dpi'], 
+                    bbox_inches='tight', facecolor='white')
+        if key is not None:
+            self._key_path(filename).write_text(key)
         return output_path
     
+    def tvl_histogram_data(self):
+        """Bin counts, count, median and mean of the non-zero TVL values"""
+        count, median, mean = self.index.positive_summary()
+        return self.index.histogram(TVL_BIN_EDGES), TVL_BIN_EDGES, int(count), median, mean
+    
+    def top_protocols_data(self, n=10):
+        """The n protocols with the highest TVL"""
+        return self.index.top(n)
+    
+    def category_counts_data(self):
+        """Number of protocols per category, most common first"""
+        return self.df['category'].value_counts()
+    
     def create_tvl_distribution_chart(self):
         """Generate standardized TVL distribution histogram"""
-        plt.figure(figsize=CHART_CONFIG['figsize_large'])
-        
-        # Filter and prepare data
-        non_zero_tvl = self.df[self.df['tvl'] > 0]['tvl']
-        
-        # Define standardized bin ranges
-        bin_ranges = [
-            (0,      1e4,     '$0-10K'),
-            (1e4,    1e5,     '$10K-100K'),
-            (1e5,    1e6,     '$100K-1M'),
-            (1e6,    1e7,     '$1M-10M'),
-            (1e7,    1e8,     '$10M-100M'),
-            (1e8,    1e9,     '$100M-1B'),
-            (1e9,    1e10,    '$1B-10B'),
-            (1e10,   float('inf'), '$10B+')
-        ]
-        
-        bins = [range[0] for range in bin_ranges] + [bin_ranges[-1][1]]
-        
-        # Create histogram with uniform width
-        counts, edges, patches = plt.hist(
-            non_zero_tvl,
+        filename = 'tvl_distribution.png'
+        bin_counts, bins, total_protocols, median_tvl, mean_tvl = self.tvl_histogram_data()
+        key = self.cache_key(filename, bin_counts, total_protocols, median_tvl, mean_tvl)
+        if self.is_cached(filename, key):
+            return self.output_dir / filename
+        
+        fig = Figure(figsize=CHART_CONFIG['figsize_large'])
+        ax = fig.subplots()
+        bin_ranges = TVL_BIN_RANGES
+        
+        # Create histogram with uniform width from the precomputed bin counts
+        counts, edges, patches = ax.hist(
+            bins[:-1],
             bins=bins,
+            weights=bin_counts,
             color=CHART_CONFIG['colors']['histogram'],
             alpha=0.7,
             edgecolor='white',
@@ -100,12 +142,11 @@ class ChartGenerator:
         )
         
         # Add value labels and percentages
-        total_protocols = len(non_zero_tvl)
         for i in range(len(counts)):
             if counts[i] > 0:
                 count = int(counts[i])
                 percentage = (count / total_protocols) * 100
-                plt.text(
+                ax.text(
                     (edges[i] + edges[i+1])/2,  # x position
                     counts[i],                   # y position
                     f'{count}\n({percentage:.1f}%)',  # label
@@ -115,11 +156,11 @@ class ChartGenerator:
                 )
         
         # Customize axes
-        plt.gca().set_xscale('log')
-        plt.gca().xaxis.set_major_formatter(FuncFormatter(millions_formatter))
+        ax.set_xscale('log')
+        ax.xaxis.set_major_formatter(FuncFormatter(millions_formatter))
         
         # Add custom x-axis labels
-        plt.xticks(
+        ax.set_xticks(
             [(range[0] + range[1])/2 for range in bin_ranges[:-1]] + [bin_ranges[-1][0]],
             [range[2] for range in bin_ranges],
             rotation=45,
@@ -127,113 +168,242 @@ class ChartGenerator:
         )
         
         # Customize appearance
-        plt.title('Distribution of Total Value Locked (TVL) Across Protocols', 
-                 pad=20, fontsize=14, fontweight='bold')
-        plt.xlabel('Total Value Locked (Log Scale)', labelpad=10)
-        plt.ylabel('Number of Protocols', labelpad=10)
+        ax.set_title('Distribution of Total Value Locked (TVL) Across Protocols', 
+                     pad=20, fontsize=14, fontweight='bold')
+        ax.set_xlabel('Total Value Locked (Log Scale)', labelpad=10)
+        ax.set_ylabel('Number of Protocols', labelpad=10)
         
         # Add grid with reduced opacity
-        plt.grid(True, alpha=0.3, axis='y')
+        ax.grid(True, alpha=0.3, axis='y')
         
         # Add summary statistics
         stats_text = (
             f'Total Protocols: {total_protocols:,}\n'
-            f'Median TVL: {millions_formatter(non_zero_tvl.median(), None)}\n'
-            f'Mean TVL: {millions_formatter(non_zero_tvl.mean(), None)}'
+            f'Median TVL: {millions_formatter(median_tvl, None)}\n'
+            f'Mean TVL: {millions_formatter(mean_tvl, None)}'
         )
-        plt.text(
+        ax.text(
             0.95, 0.95, stats_text,
-            transform=plt.gca().transAxes,
+            transform=ax.transAxes,
             verticalalignment='top',
             horizontalalignment='right',
             bbox=dict(facecolor='white', alpha=0.8, edgecolor='none')
         )
         
-        return self.save_figure('tvl_distribution.png')
+        return self.save_figure(fig, filename, key)
     
     def create_top_protocols_chart(self):
         """Generate top protocols bar chart"""
-        top_10 = self.df.nlargest(10, 'tvl')
+        filename = 'top_protocols.png'
+        top_10 = self.top_protocols_data(10)
+        key = self.cache_key(filename, top_10[['protocol', 'tvl']])
+        if self.is_cached(filename, key):
+            return self.output_dir / filename
         
-        plt.figure(figsize=CHART_CONFIG['figsize_large'])
-        bars = plt.bar(top_10['protocol'], top_10['tvl'], 
+        fig = Figure(figsize=CHART_CONFIG['figsize_large'])
+        ax = fig.subplots()
+        bars = ax.bar(top_10['protocol'], top_10['tvl'], 
                       color=color_palette('husl', n_colors=10))  # Use specific seaborn function
         
-        plt.title('Top 10 Protocols by Total Value Locked (TVL)')
-        plt.xlabel('Protocol')
-        plt.ylabel('Total Value Locked')
-        plt.grid(True, axis='y', alpha=0.3)
+        ax.set_title('Top 10 Protocols by Total Value Locked (TVL)')
+        ax.set_xlabel('Protocol')
+        ax.set_ylabel('Total Value Locked')
+        ax.grid(True, axis='y', alpha=0.3)
         
-        plt.gca().yaxis.set_major_formatter(FuncFormatter(millions_formatter))
+        ax.yaxis.set_major_formatter(FuncFormatter(millions_formatter))
         
         # Add value labels
-        self._add_bar_labels(bars)
-        plt.xticks(rotation=45, ha='right')
+        self._add_bar_labels(ax, bars)
+        ax.set_xticks(range(len(top_10)), top_10['protocol'], rotation=45, ha='right')
         
-        return self.save_figure('top_protocols.png')
+        return self.save_figure(fig, filename, key)
     
     @staticmethod
-    def _add_bar_labels(bars):
+    def _add_bar_labels(ax, bars):
         """Helper method to add labels to bars"""
         for bar in bars:
             height = bar.get_height()
             label_position = height * 1.02  # 2% above bar
-            plt.text(bar.get_x() + bar.get_width()/2., label_position,
+            ax.text(bar.get_x() + bar.get_width()/2., label_position,
                     millions_formatter(height, None),
                     ha='center', va='bottom', fontsize=10)
     
     def create_category_distribution_chart(self):
         """Generate pie chart showing distribution across categories"""
-        category_counts = self.df['category'].value_counts()
+        filename = 'category_distribution.png'
+        category_counts = self.category_counts_data()
+        key = self.cache_key(filename, category_counts)
+        if self.is_cached(filename, key):
+            return self.output_dir / filename
         
-        plt.figure(figsize=CHART_CONFIG['figsize_medium'])
-        plt.pie(category_counts.values, labels=category_counts.index, 
-                colors=CHART_CONFIG['colors']['pie'], autopct='%1.1f%%')
+        fig = Figure(figsize=CHART_CONFIG['figsize_medium'])
+        ax = fig.subplots()
+        ax.pie(category_counts.values, labels=category_counts.index, 
+               colors=CHART_CONFIG['colors']['pie'], autopct='%1.1f%%')
         
-        plt.title('Distribution of Protocols by Category')
-        return self.save_figure('category_distribution.png')
+        ax.set_title('Distribution of Protocols by Category')
+        return self.save_figure(fig, filename, key)
 
-def clean_dataframe(csv_path):
-    """Clean and prepare the dataframe"""
+# Composability landscape: above this many groups points are aggregated into hexbins
+COMPOSABILITY_MAX_POINTS = 5_000
+# Above this many points the scatter is rasterized instead of drawn as vector paths
+COMPOSABILITY_RASTERIZE_POINTS = 500
+# Categories with their own colour and legend entry, by total TVL; the rest are 'Other'
+COMPOSABILITY_LEGEND_CATEGORIES = 10
+COMPOSABILITY_HEXBIN_GRIDSIZE = 60
+
+def draw_composability_landscape(ax, composability: pd.DataFrame, max_points: int = COMPOSABILITY_MAX_POINTS,
+                                 legend_categories: int = COMPOSABILITY_LEGEND_CATEGORIES):
+    """Total TVL vs protocol count per category/subcategory group on ax.
+
+    Small inputs are a scatter sized by Yield_Potential and coloured by category,
+    with the legend capped to the top categories by TVL. Inputs above max_points
+    become a log-count hexbin, so render time does not grow with the row count.
+    """
+    # Log x-axis: groups without positive TVL cannot be placed
+    plotted = composability[composability['Total_TVL'] > 0]
+    x = plotted['Total_TVL'].to_numpy(dtype=float)
+    y = plotted['Protocol_Count'].to_numpy(dtype=float)
+
+    if len(plotted) > max_points:
+        hexbin = ax.hexbin(x, y, xscale='log', bins='log', gridsize=COMPOSABILITY_HEXBIN_GRIDSIZE,
+                           cmap='viridis', mincnt=1)
+        ax.figure.colorbar(hexbin, ax=ax, label='Groups (log scale)')
+        ax.set_title(f'DeFi Composability Landscape ({len(plotted):,} groups, density)')
+    else:
+        yield_potential = plotted['Yield_Potential'].to_numpy(dtype=float)
+        finite = np.isfinite(yield_potential)
+        low, high = (yield_potential[finite].min(), yield_potential[finite].max()) if finite.any() else (0.0, 0.0)
+        scaled = (yield_potential - low) / (high - low) if high > low else np.zeros_like(yield_potential)
+        sizes = 20 + 280 * np.nan_to_num(scaled)
+
+        top_categories = plotted.groupby('Category', observed=True)['Total_TVL'].sum() \
+            .nlargest(legend_categories).index.tolist()
+        categories = plotted['Category'].to_numpy(dtype=object)
+        rasterized = len(plotted) > COMPOSABILITY_RASTERIZE_POINTS
+
+        other = ~np.isin(categories, top_categories)
+        if other.any():
+            ax.scatter(x[other], y[other], s=sizes[other], color='lightgrey', alpha=0.5,
+                       label='Other', rasterized=rasterized)
+        for category, color in zip(top_categories, color_palette('husl', n_colors=len(top_categories))):
+            selected = categories == category
+            ax.scatter(x[selected], y[selected], s=sizes[selected], color=color, alpha=0.7,
+                       label=str(category), rasterized=rasterized)
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', title='Category (top by TVL)')
+        ax.set_xscale('log')
+        ax.set_title('DeFi Composability Landscape')
+
+    ax.set_xlabel('Total TVL (log scale)')
+    ax.set_ylabel('Number of Protocols')
+    ax.xaxis.set_major_formatter(FuncFormatter(millions_formatter))
+
+def create_composability_landscape(composability: pd.DataFrame, output_path: Path,
+                                   max_points: int = COMPOSABILITY_MAX_POINTS) -> Path:
+    """Render the composability landscape headlessly to output_path"""
+    fig = Figure(figsize=CHART_CONFIG['figsize_medium'])
+    draw_composability_landscape(fig.subplots(), composability, max_points)
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=CHART_CONFIG['dpi'], bbox_inches='tight', facecolor='white')
+    logging.info(f"Saved composability landscape to {output_path}")
+    return Path(output_path)
+
+# Chart titles mapped to the ChartGenerator method that renders them
+CHARTS = {
+    'TVL Distribution':      'create_tvl_distribution_chart',
+    'Top Protocols':         'create_top_protocols_chart',
+    'Category Distribution': 'create_category_distribution_chart'
+}
+
+# Columns the chart methods read; only these are shipped to worker processes
+CHART_COLUMNS = ['protocol', 'category', 'tvl']
+
+def render_chart(title, method_name, df, output_dir: Path, use_cache: bool = True):
+    """Render a single chart in a worker process, returning its path and stage timing"""
+    recorder = StageRecorder()
     try:
-        df = pd.read_csv(csv_path)
-        df.columns = df.columns.str.lower()
-        
-        # Vectorized operation instead of apply
-        df['tvl'] = pd.to_numeric(
-            df['tvl'].replace(r'[\$,]', '', regex=True),
-            errors='coerce'
-        ).fillna(0)
-        
-        return df
-    
+        with recorder.stage(f'chart:{title}'):
+            path = getattr(ChartGenerator(df, output_dir, use_cache), method_name)()
     except Exception as e:
-        logging.error(f"Error processing CSV file {csv_path}: {str(e)}")
+        # Exceptions pickle their __dict__, so the failed stage's record reaches the parent
+        e.stage_record = recorder.stages[-1]
         raise
+    return path, recorder.stages[-1]
+
+class AggregateChartGenerator(ChartGenerator):
+    """Render the standard charts from streamed aggregates instead of a loaded frame"""
+    
+    def __init__(self, aggregates, output_dir: Path, use_cache: bool = True):
+        self.aggregates        = aggregates
+        self.output_dir        = output_dir
+        self.use_cache         = use_cache
+        self.setup_plot_style()
+    
+    def tvl_histogram_data(self):
+        return self.aggregates.tvl_histogram_data()
+    
+    def top_protocols_data(self, n=10):
+        return self.aggregates.top_protocols(n)
+    
+    def category_counts_data(self):
+        return self.aggregates.category_counts_data()
+
+def generate_charts_from_aggregates(aggregates, output_dir: Path, use_cache: bool = True):
+    """Generate all charts from streaming.StreamingStats without loading the dataset"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    chart_gen = AggregateChartGenerator(aggregates, output_dir, use_cache)
+    charts = {title: getattr(chart_gen, method_name)() for title, method_name in CHARTS.items()}
+    logging.info("Successfully generated all charts")
+    return charts
 
-def generate_all_charts(csv_path: Path, output_dir: Path):
-    """Main function to generate all charts"""
+def clean_dataframe(csv_path, use_cache: bool = True):
+    """Clean and prepare the dataframe"""
+    return load_dataset(csv_path, use_cache=use_cache)
+
+def generate_all_charts(data: Union[Path, pd.DataFrame], output_dir: Path, workers: int = 1,
+                        use_cache: bool = True):
+    """Main function to generate all charts from a CSV path or an already-loaded frame.
+
+    workers=None defaults to min(chart count, CPU count). Charts whose inputs, config
+    and style are unchanged since the last render are not re-rendered unless
+    use_cache is False.
+    """
     try:
         # Create output directory if it doesn't exist
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        df = clean_dataframe(csv_path)
-        chart_gen = ChartGenerator(df, output_dir)
+        df = ensure_dataframe(data)
+        if workers is None:
+            workers = min(len(CHARTS), os.cpu_count() or 1)
         
         # Generate all charts and collect their paths
         charts = {}
         
-        # Generate TVL distribution chart
-        tvl_path = chart_gen.create_tvl_distribution_chart()
-        charts['TVL Distribution'] = tvl_path
-        
-        # Generate top protocols chart
-        protocols_path = chart_gen.create_top_protocols_chart()
-        charts['Top Protocols'] = protocols_path
-        
-        # Generate category distribution chart
-        category_path = chart_gen.create_category_distribution_chart()
-        charts['Category Distribution'] = category_path
+        if workers == 1:
+            chart_gen = ChartGenerator(df, output_dir, use_cache)
+            for title, method_name in CHARTS.items():
+                with stage(f'chart:{title}'):
+                    charts[title] = getattr(chart_gen, method_name)()
+        else:
+            chart_df = df[CHART_COLUMNS].copy()
+            with ProcessPoolExecutor(max_workers=workers,
+                                     initializer=ChartGenerator.setup_plot_style) as pool:
+                futures = {
+                    title: pool.submit(render_chart, title, method_name, chart_df, output_dir, use_cache)
+                    for title, method_name in CHARTS.items()
+                }
+                first_error = None
+                for title, future in futures.items():
+                    try:
+                        charts[title], record = future.result()
+                    except Exception as e:
+                        # Keep every chart's stage record, failed ones included, before re-raising
+                        record = getattr(e, 'stage_record', None)
+                        first_error = first_error or e
+                    if record is not None:
+                        record_stage(record)
+                if first_error is not None:
+                    raise first_error
         
         logging.info("Successfully generated all charts")
         return charts
@@ -243,6 +413,10 @@ def generate_all_charts(csv_path: Path, output_dir: Path):
         raise
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     try:
         generate_all_charts('your_data.csv', Path('output/solana-defi-llama-scraped/charts'))  # Now works with default output_dir
     except Exception as e:
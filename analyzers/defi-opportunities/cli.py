@@ -0,0 +1,291 @@
+# python cli.py ingest --chain Solana --output solana.csv
+# python cli.py stats solana.csv
+# python cli.py charts solana.csv --output charts/
+# python cli.py opportunities solana.csv --threshold 0.5 --top-k 10
+# python cli.py aggregate state.json --delta delta.csv --remove "Old Protocol"
+# python cli.py sweep solana.csv --thresholds 0.1 0.5 1 --scorers log_tvl_x_count sqrt_tvl_x_count
+# python cli.py functions solana.csv
+# python cli.py partners solana.csv "Marinade Finance"
+# python cli.py serve solana.csv --port 8080
+# python cli.py resolve solana.csv --output merged.csv --threshold 0.7
+# python cli.py history output/solana-defi-llama-scraped/history --start 2024-06-01 --level category
+# python cli.py import-times
+#
+# Handlers import analyzer modules lazily, so `stats` never loads matplotlib, seaborn or scipy.
+import argparse
+import json
+import logging
+import subprocess
+import sys
+from pathlib import Path
+
+# Cold-import budget per subcommand, in seconds, checked by `import-times`
+IMPORT_BUDGET_S = {
+    'stats':         1.0,
+    'functions':     1.0,
+    'opportunities': 1.0,
+    'ingest':        1.0,
+    'aggregate':     1.0,
+    'charts':        3.0
+}
+
+# Modules each subcommand imports, and heavy modules it must not pull in
+SUBCOMMAND_MODULES = {
+    'stats':         (['stats', 'loader'], ['matplotlib', 'seaborn', 'scipy']),
+    'functions':     (['function_analysis'], ['matplotlib', 'seaborn', 'scipy']),
+    'opportunities': (['opportunities'], ['matplotlib', 'seaborn', 'scipy']),
+    'ingest':        (['ingest'], ['matplotlib', 'seaborn', 'scipy']),
+    'aggregate':     (['incremental'], ['matplotlib', 'seaborn', 'scipy']),
+    'charts':        (['charts'], [])
+}
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[logging.StreamHandler(sys.stderr)]
+    )
+
+def to_jsonable(stats: dict) -> dict:
+    return {key: value.item() if hasattr(value, 'item') else value for key, value in stats.items()}
+
+def run_ingest(args):
+    from ingest import ingest
+    ingest(args.output, args.chain, args.base_url, args.cache_dir, args.concurrency, args.limit)
+
+def run_stats(args):
+    if args.streaming:
+        from streaming import generate_stats_report_streaming
+        stats = generate_stats_report_streaming(args.csv, chunksize=args.chunksize)
+    else:
+        from loader import load_dataset
+        from stats import generate_stats_report
+        stats = generate_stats_report(load_dataset(args.csv))
+
+    if args.json:
+        print(json.dumps(to_jsonable(stats)))
+    else:
+        for key, value in stats.items():
+            print(f"{key}: {value:,.2f}" if isinstance(value, float) else f"{key}: {value:,}")
+
+def run_charts(args):
+    from charts import generate_all_charts
+    charts = generate_all_charts(args.csv, args.output, workers=args.workers, use_cache=not args.no_cache)
+    for title, path in charts.items():
+        print(f"{title}: {path}")
+
+def run_aggregate(args):
+    from incremental import AggregateState
+    state = AggregateState.load(args.state) if args.state.exists() else AggregateState()
+    for delta in args.delta:
+        state.apply_delta(delta)
+    if args.remove:
+        state.remove(args.remove)
+    if args.delta or args.remove:
+        state.save(args.state)
+
+    stats = state.stats_report()
+    if args.json:
+        print(json.dumps(to_jsonable(stats)))
+    else:
+        for key, value in stats.items():
+            print(f"{key}: {value:,.2f}" if isinstance(value, float) else f"{key}: {value:,}")
+    if args.composability:
+        print(state.composability().to_string(index=False))
+
+def run_opportunities(args):
+    from loader import load_dataset
+    from opportunities import analyze_composability, calculate_yield_potential, find_composability_opportunities
+    composability = calculate_yield_potential(analyze_composability(load_dataset(args.csv)))
+    opportunities = find_composability_opportunities(
+        composability, args.threshold, top_k=args.top_k, unordered=args.unordered
+    )
+    for opp in opportunities:
+        print(f"{opp[0]} ({opp[1]}) + {opp[2]} ({opp[3]}) - Synergy Score: {opp[4]:.2f}")
+    if args.plot:
+        from opportunities import visualize_composability
+        print(f"Composability landscape: {visualize_composability(composability, args.plot)}")
+
+def run_sweep(args):
+    from loader import load_dataset
+    from opportunities import analyze_composability, calculate_yield_potential
+    from sweep import OpportunitySweep
+    composability = calculate_yield_potential(analyze_composability(load_dataset(args.csv)))
+    sweep = OpportunitySweep(composability, args.scorers, unordered=args.unordered, min_threshold=min(args.thresholds))
+    print(sweep.sweep_table(args.thresholds).to_string(index=False))
+
+def run_functions(args):
+    from function_analysis import standardize_functions
+    _, summary = standardize_functions(args.csv, args.output_dir)
+    print(summary.to_string())
+
+def run_partners(args):
+    from similarity import find_composable_partners
+    partners = find_composable_partners(args.csv, args.protocol, k=args.top_k, weighting=args.weighting,
+                                        exclude_same_category=not args.same_category)
+    print(partners.to_string(index=False))
+
+def run_serve(args):
+    import asyncio
+    from service import DatasetService
+    service = DatasetService(args.csv, args.poll_interval, args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+def run_resolve(args):
+    from loader import load_dataset
+    from resolve import merge_protocol_entities, plan_protocol_merges
+    df = load_dataset(args.csv)
+    # Always list the merges first, so they can be reviewed before --output applies them
+    merges = plan_protocol_merges(df, args.threshold, args.strip_generic_words)
+    for category, protocol, canonical in merges.itertuples(index=False):
+        print(f"{protocol} -> {canonical} ({category})")
+    if args.output:
+        merged = merge_protocol_entities(df, tvl_aggregation=args.tvl_aggregation, plan=merges)
+        merged.to_csv(args.output, index=False)
+        print(f"Wrote {len(merged):,} protocols ({len(df):,} rows before merging) to {args.output}")
+
+def run_history(args):
+    from history import SnapshotStore
+    panel = SnapshotStore(args.store).panel(args.start, args.end, level=args.level)
+    if len(panel.timestamps) == 0:
+        print("No snapshots in range")
+        return
+    print(f"{len(panel.timestamps)} snapshots from {panel.timestamps[0]} to {panel.timestamps[-1]}\n")
+    report = panel.deltas().join(panel.rank_changes()[['End_Rank', 'Rank_Change']])
+    if args.window:
+        report[f'Growth_{args.window}'] = panel.rolling_growth(args.window).iloc[-1]
+    print(report.head(args.top_k).to_string())
+
+def measure_import(modules, forbidden) -> dict:
+    """Cold-import modules in a fresh interpreter; reports seconds and forbidden modules that got loaded"""
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"for name in {modules!r}: __import__(name)\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {forbidden!r} if m in sys.modules]}}))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parent).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_import_times(args):
+    over_budget = False
+    for subcommand, (modules, forbidden) in SUBCOMMAND_MODULES.items():
+        result = measure_import(modules, forbidden)
+        budget = IMPORT_BUDGET_S[subcommand]
+        failed = result['seconds'] > budget or result['loaded']
+        over_budget = over_budget or failed
+        extra = f" (loaded {', '.join(result['loaded'])})" if result['loaded'] else ""
+        print(f"{subcommand:<14} {result['seconds']:.3f}s / {budget:.1f}s {'FAIL' if failed else 'ok'}{extra}")
+    if over_budget:
+        sys.exit(1)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='DeFi opportunities analyzers')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest_parser = subparsers.add_parser('ingest', help='Fetch a chain\'s protocols from the DefiLlama API into a CSV')
+    ingest_parser.add_argument('--chain', default='Solana')
+    ingest_parser.add_argument('--output', type=Path, default=Path('solana.csv'))
+    ingest_parser.add_argument('--base-url', default='https://api.llama.fi', help='API root, e.g. a local stub server')
+    ingest_parser.add_argument('--cache-dir', type=Path, default=Path('.http_cache'))
+    ingest_parser.add_argument('--concurrency', type=int, default=16)
+    ingest_parser.add_argument('--limit', type=int, help='Only the N protocols with the highest TVL on the chain')
+    ingest_parser.set_defaults(handler=run_ingest)
+
+    stats_parser = subparsers.add_parser('stats', help='Summary statistics only (no plotting libraries)')
+    stats_parser.add_argument('csv', type=Path)
+    stats_parser.add_argument('--json', action='store_true', help='Print the stats as one JSON object')
+    stats_parser.add_argument('--streaming', action='store_true', help='Read the CSV in chunks')
+    stats_parser.add_argument('--chunksize', type=int, default=100_000)
+    stats_parser.set_defaults(handler=run_stats)
+
+    charts_parser = subparsers.add_parser('charts', help='Render the report charts')
+    charts_parser.add_argument('csv', type=Path)
+    charts_parser.add_argument('--output', type=Path, default=Path('output/solana-defi-llama-scraped/charts'))
+    charts_parser.add_argument('--workers', type=int, default=1, help='Render processes (0 = one per chart, up to the CPU count)')
+    charts_parser.add_argument('--no-cache', action='store_true', help='Re-render unchanged charts')
+    charts_parser.set_defaults(handler=run_charts)
+
+    aggregate_parser = subparsers.add_parser('aggregate', help='Stats from persisted aggregates, updated with deltas')
+    aggregate_parser.add_argument('state', type=Path, help='Aggregate state file, created if missing')
+    aggregate_parser.add_argument('--delta', type=Path, action='append', default=[],
+                                  help='CSV of new or changed protocol rows; may be repeated')
+    aggregate_parser.add_argument('--remove', nargs='+', help='Protocols that disappeared from the source')
+    aggregate_parser.add_argument('--composability', action='store_true', help='Also print the composability table')
+    aggregate_parser.add_argument('--json', action='store_true')
+    aggregate_parser.set_defaults(handler=run_aggregate)
+
+    opportunities_parser = subparsers.add_parser('opportunities', help='Composability opportunities')
+    opportunities_parser.add_argument('csv', type=Path)
+    opportunities_parser.add_argument('--threshold', type=float, default=0.5)
+    opportunities_parser.add_argument('--top-k', type=int, default=10)
+    opportunities_parser.add_argument('--unordered', action='store_true', help='Drop symmetric duplicate pairs')
+    opportunities_parser.add_argument('--plot', type=Path, help='Also write the composability landscape to this image')
+    opportunities_parser.set_defaults(handler=run_opportunities)
+
+    sweep_parser = subparsers.add_parser('sweep', help='Opportunity counts across thresholds and yield scorers')
+    sweep_parser.add_argument('csv', type=Path)
+    sweep_parser.add_argument('--thresholds', type=float, nargs='+', default=[0.1, 0.25, 0.5, 1.0, 2.0])
+    sweep_parser.add_argument('--scorers', nargs='+', default=['log_tvl_x_count'],
+                              help='Yield scorers from opportunities.YIELD_SCORERS')
+    sweep_parser.add_argument('--unordered', action='store_true', help='Drop symmetric duplicate pairs')
+    sweep_parser.set_defaults(handler=run_sweep)
+
+    functions_parser = subparsers.add_parser('functions', help='Standardized protocol functions')
+    functions_parser.add_argument('csv', type=Path)
+    functions_parser.add_argument('--output-dir', type=Path, default=Path('.'))
+    functions_parser.set_defaults(handler=run_functions)
+
+    partners_parser = subparsers.add_parser('partners', help='Protocols with the most similar function profile')
+    partners_parser.add_argument('csv', type=Path)
+    partners_parser.add_argument('protocol')
+    partners_parser.add_argument('--top-k', type=int, default=10)
+    partners_parser.add_argument('--weighting', choices=['tfidf', 'tvl', 'binary'], default='tfidf')
+    partners_parser.add_argument('--same-category', action='store_true', help='Also return partners from the same category')
+    partners_parser.set_defaults(handler=run_partners)
+
+    serve_parser = subparsers.add_parser('serve', help='Serve queries over HTTP/JSON from the in-memory dataset')
+    serve_parser.add_argument('csv', type=Path)
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080)
+    serve_parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between source file checks')
+    serve_parser.add_argument('--workers', type=int, default=4, help='Threads for query computation (0 = executor default)')
+    serve_parser.set_defaults(handler=run_serve)
+
+    resolve_parser = subparsers.add_parser('resolve', help='Merge near-duplicate protocol names from multi-source scrapes')
+    resolve_parser.add_argument('csv', type=Path)
+    resolve_parser.add_argument('--threshold', type=float, default=0.7, help='Minimum name n-gram Jaccard similarity')
+    resolve_parser.add_argument('--strip-generic-words', action='store_true',
+                                help='Also merge names differing only by words like Finance or Protocol')
+    resolve_parser.add_argument('--tvl-aggregation', choices=['max', 'sum'], default='max')
+    resolve_parser.add_argument('--output', type=Path, help='Also write the merged dataset here')
+    resolve_parser.set_defaults(handler=run_resolve)
+
+    history_parser = subparsers.add_parser('history', help='TVL deltas, growth and rank changes from stored snapshots')
+    history_parser.add_argument('store', type=Path, help='Snapshot store directory')
+    history_parser.add_argument('--start', help='Earliest snapshot time, e.g. 2024-06-01')
+    history_parser.add_argument('--end', help='Latest snapshot time; a date includes that whole day')
+    history_parser.add_argument('--level', choices=['protocol', 'category', 'subcategory'], default='protocol')
+    history_parser.add_argument('--window', help='Also show trailing growth over this window, e.g. 1D')
+    history_parser.add_argument('--top-k', type=int, default=20)
+    history_parser.set_defaults(handler=run_history)
+
+    import_parser = subparsers.add_parser('import-times', help='Check cold-import time against the budget')
+    import_parser.set_defaults(handler=run_import_times)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, 'workers', None) == 0:
+        args.workers = None
+    setup_logging()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main()
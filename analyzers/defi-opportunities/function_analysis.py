@@ -1,78 +1,98 @@
 import pandas as pd
+import numpy as np
 import re
+from functools import lru_cache
+from pathlib import Path
+from loader import ensure_dataframe
 
-def standardize_functions(csv_path):
-    # Read the CSV
-    df = pd.read_csv(csv_path)
+# Function mapping for standardization; earlier patterns take priority
+FUNCTION_MAPPING = {
+    # Staking related
+    r'stake|staking|restake|restaking': 'staking',
+    r'liquid\s*stak': 'liquid_staking',
     
-    # Create a new dataframe for standardized functions
-    functions_df = pd.DataFrame(columns=['Protocol', 'Function', 'Category', 'TVL'])
+    # Trading related
+    r'trade|trading|swap': 'trading',
+    r'leverage|leveraged': 'leveraged_trading',
+    r'perpetual|perps': 'perpetuals_trading',
+    r'options|option trading': 'options_trading',
     
-    # Function mapping for standardization
-    function_mapping = {
-        # Staking related
-        r'stake|staking|restake|restaking': 'staking',
-        r'liquid\s*stak': 'liquid_staking',
-        
-        # Trading related
-        r'trade|trading|swap': 'trading',
-        r'leverage|leveraged': 'leveraged_trading',
-        r'perpetual|perps': 'perpetuals_trading',
-        r'options|option trading': 'options_trading',
-        
-        # Yield related
-        r'yield\s*farm': 'yield_farming',
-        r'liquidity\s*provision|provide\s*liquidity|LP': 'liquidity_provision',
-        r'earn\s*yield|yield\s*generation': 'yield_generation',
-        
-        # Lending related
-        r'borrow|lending|lend': 'lending',
-        r'margin|margined': 'margin_lending',
-        
-        # Other
-        r'governance': 'governance',
-        r'insurance': 'insurance',
-        r'launchpad': 'launchpad',
-    }
+    # Yield related
+    r'yield\s*farm': 'yield_farming',
+    r'liquidity\s*provision|provide\s*liquidity|LP': 'liquidity_provision',
+    r'earn\s*yield|yield\s*generation': 'yield_generation',
     
-    rows = []
+    # Lending related
+    r'borrow|lending|lend': 'lending',
+    r'margin|margined': 'margin_lending',
     
-    for _, row in df.iterrows():
-        if pd.isna(row['what can be done today']):
-            continue
-            
-        # Split functions by common delimiters
-        functions = re.split(r'[,•\n]', str(row['what can be done today']))
-        
-        for func in functions:
-            func = func.strip().lower()
-            if not func:
-                continue
-                
-            # Standardize the function name
-            standardized = 'other'
-            for pattern, standard in function_mapping.items():
-                if re.search(pattern, func, re.IGNORECASE):
-                    standardized = standard
-                    break
-            
-            rows.append({
-                'Protocol': row['Protocol'],
-                'Function': standardized,
-                'Category': row['category'],
-                'TVL': row['tvl']
-            })
+    # Other
+    r'governance': 'governance',
+    r'insurance': 'insurance',
+    r'launchpad': 'launchpad',
+}
+
+FUNCTION_DELIMITERS = r'[,•\n]'
+
+def compile_function_mapping(mapping):
+    """Compile the mapping into one regex whose named group tells which pattern matched.
+
+    Every alternative is a lookahead anchored at the start of the fragment, so the
+    alternation is tried in mapping order and the first pattern found anywhere wins,
+    exactly like searching each pattern in turn.
+    """
+    alternatives = [
+        rf'(?=[\s\S]*?(?:{pattern}))(?P<f{index}>)'
+        for index, pattern in enumerate(mapping)
+    ]
+    return re.compile('|'.join(alternatives), re.IGNORECASE), list(mapping.values())
+
+FUNCTION_REGEX, FUNCTION_NAMES = compile_function_mapping(FUNCTION_MAPPING)
+
+@lru_cache(maxsize=65536)
+def classify_function(fragment: str) -> str:
+    """Standardized function name for one lowercase description fragment"""
+    match = FUNCTION_REGEX.match(fragment)
+    if match is None:
+        return 'other'
+    return FUNCTION_NAMES[int(match.lastgroup[1:])]
+
+def split_function_fragments(descriptions: pd.Series) -> pd.Series:
+    """Split descriptions on common delimiters into one cleaned fragment per row, keeping the source index"""
+    fragments = descriptions.dropna().astype(str).str.split(FUNCTION_DELIMITERS, regex=True).explode()
+    fragments = fragments.str.strip().str.lower()
+    return fragments[fragments.notna() & (fragments != '')]
+
+def classify_fragments(fragments: pd.Series) -> np.ndarray:
+    """Classify fragments in bulk, running the regex once per distinct fragment"""
+    codes, uniques = pd.factorize(fragments)
+    labels = np.array([classify_function(fragment) for fragment in uniques], dtype=object)
+    return labels[codes]
+
+def classify_protocol_functions(data) -> pd.DataFrame:
+    """One deduplicated (Protocol, Function, Category, TVL) row per standardized protocol function"""
+    # Accept a CSV path or the frame already produced by loader.load_dataset
+    df = ensure_dataframe(data)
     
-    functions_df = pd.DataFrame(rows)
+    # Fragments are indexed by the row position they came from
+    fragments = split_function_fragments(df['what can be done today'].reset_index(drop=True))
+    source = df.iloc[fragments.index]
     
-    # Clean TVL values
-    functions_df['TVL'] = functions_df['TVL'].str.replace('$', '').str.replace(',', '').astype(float)
+    functions_df = pd.DataFrame({
+        'Protocol': source['protocol'].to_numpy(),
+        'Function': classify_fragments(fragments),
+        'Category': source['category'].to_numpy(),
+        'TVL': source['tvl'].to_numpy()
+    })
     
     # Add deduplication
-    functions_df = functions_df.drop_duplicates()
+    return functions_df.drop_duplicates()
+
+def standardize_functions(data, output_dir: Path = Path('.')):
+    functions_df = classify_protocol_functions(data)
     
     # Save to CSV
-    functions_df.to_csv('function_analysis.csv', index=False)
+    functions_df.to_csv(Path(output_dir) / 'function_analysis.csv', index=False)
     
     # Generate summary statistics
     summary = functions_df.groupby('Function').agg({
@@ -81,7 +101,7 @@ def standardize_functions(csv_path):
     }).sort_values('TVL', ascending=False)
     
     summary.columns = ['Number of Protocols', 'Total TVL']
-    summary.to_csv('function_summary.csv')
+    summary.to_csv(Path(output_dir) / 'function_summary.csv')
     
     return functions_df, summary
 
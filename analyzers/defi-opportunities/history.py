@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+# Columns kept per snapshot; the snapshot time comes from the file name
+HISTORY_COLUMNS = ['protocol', 'category', 'subcategory', 'tvl']
+
+PARTITION_PREFIX = 'date='
+SNAPSHOT_NAME_FORMAT = '%H%M%S_%f'
+
+TimeBound = Union[str, date, datetime, pd.Timestamp, None]
+
+DATE_ONLY = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def _timestamp(value: TimeBound, end: bool = False):
+    """Naive UTC timestamp, like the snapshot file names; a date-only end bound means the end of that day"""
+    if value is None:
+        return None
+    timestamp = pd.Timestamp(value)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    date_only = DATE_ONLY.fullmatch(value.strip()) if isinstance(value, str) \
+        else isinstance(value, date) and not isinstance(value, datetime)
+    if end and date_only:
+        timestamp += pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
+    return timestamp
+
+class SnapshotStore:
+    """Append-only TVL history, one Parquet file per snapshot in date=YYYY-MM-DD partitions.
+
+    Snapshot times are encoded in partition and file names, so a date range is
+    resolved from directory listings and only the matching files are read.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _snapshot_path(self, taken_at: pd.Timestamp) -> Path:
+        partition = self.root / f"{PARTITION_PREFIX}{taken_at:%Y-%m-%d}"
+        return partition / f"{taken_at.strftime(SNAPSHOT_NAME_FORMAT)}.parquet"
+
+    def append(self, df: pd.DataFrame, taken_at: TimeBound = None) -> Path:
+        """Store the dataset as the snapshot taken at taken_at (UTC, default now)"""
+        taken_at = _timestamp(taken_at) if taken_at is not None \
+            else pd.Timestamp(datetime.now(timezone.utc).replace(tzinfo=None))
+        path = self._snapshot_path(taken_at)
+        if path.exists():
+            raise FileExistsError(f"Snapshot {path} already exists; the store is append-only")
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write under a temporary name so readers never see a partial snapshot
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        df[HISTORY_COLUMNS].to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        logging.info(f"Appended snapshot {path}")
+        return path
+
+    def _snapshot_files(self, start: TimeBound = None, end: TimeBound = None):
+        """(time, path) of the snapshots in [start, end], oldest first, from file names only"""
+        start, end = _timestamp(start), _timestamp(end, end=True)
+        first_day = f"{PARTITION_PREFIX}{start:%Y-%m-%d}" if start is not None else None
+        last_day = f"{PARTITION_PREFIX}{end:%Y-%m-%d}" if end is not None else None
+        snapshots = []
+        if not self.root.exists():
+            return snapshots
+        for partition in sorted(self.root.glob(f'{PARTITION_PREFIX}*')):
+            # Partition names sort chronologically, so whole days outside the range are skipped unlisted
+            if (first_day and partition.name < first_day) or (last_day and partition.name > last_day):
+                continue
+            day = partition.name[len(PARTITION_PREFIX):]
+            for path in sorted(partition.glob('*.parquet')):
+                taken_at = pd.Timestamp(datetime.strptime(f"{day} {path.stem}", f"%Y-%m-%d {SNAPSHOT_NAME_FORMAT}"))
+                if (start is None or taken_at >= start) and (end is None or taken_at <= end):
+                    snapshots.append((taken_at, path))
+        return snapshots
+
+    def snapshot_times(self, start: TimeBound = None, end: TimeBound = None) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex([taken_at for taken_at, _ in self._snapshot_files(start, end)])
+
+    def read(self, start: TimeBound = None, end: TimeBound = None,
+             columns: List[str] = None) -> pd.DataFrame:
+        """Long frame of the snapshots in [start, end] with a snapshot_at column"""
+        columns = columns or HISTORY_COLUMNS
+        frames = []
+        for taken_at, path in self._snapshot_files(start, end):
+            frame = pd.read_parquet(path, columns=columns)
+            frame.insert(0, 'snapshot_at', taken_at)
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame(columns=['snapshot_at'] + columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def panel(self, start: TimeBound = None, end: TimeBound = None, level: str = 'protocol') -> 'TVLPanel':
+        """Time x key TVL matrix for protocols, categories or subcategories over [start, end]"""
+        return TVLPanel.from_long(self.read(start, end, columns=[level, 'tvl']), level)
+
+class TVLPanel:
+    """TVL aligned on a (snapshot, key) grid; keys absent from a snapshot are NaN"""
+
+    def __init__(self, timestamps: pd.DatetimeIndex, keys: pd.Index, tvl: np.ndarray):
+        self.timestamps = timestamps
+        self.keys       = keys
+        self.tvl        = tvl
+
+    @classmethod
+    def from_long(cls, frame: pd.DataFrame, level: str) -> 'TVLPanel':
+        time_codes, timestamps = pd.factorize(frame['snapshot_at'], sort=True)
+        key_codes, keys = pd.factorize(frame[level].astype(str), sort=True)
+        cells = len(timestamps) * len(keys)
+        # Scatter-add handles duplicate keys within a snapshot (e.g. a category's protocols)
+        flat = time_codes * len(keys) + key_codes
+        tvl = np.bincount(flat, weights=frame['tvl'].to_numpy(dtype=float), minlength=cells).astype(float)
+        present = np.bincount(flat, minlength=cells) > 0
+        tvl[~present] = np.nan
+        return cls(pd.DatetimeIndex(timestamps), pd.Index(keys, name=level),
+                   tvl.reshape(len(timestamps), len(keys)))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.tvl, index=self.timestamps, columns=self.keys)
+
+    def deltas(self) -> pd.DataFrame:
+        """TVL change per key between the first and last snapshot; a missing key counts as 0"""
+        if len(self.timestamps) == 0:
+            return pd.DataFrame(columns=['Start_TVL', 'End_TVL', 'Delta', 'Pct_Change'])
+        start_tvl, end_tvl = np.nan_to_num(self.tvl[0]), np.nan_to_num(self.tvl[-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change = np.where(start_tvl > 0, (end_tvl - start_tvl) / start_tvl * 100, np.nan)
+        return pd.DataFrame({
+            'Start_TVL':  start_tvl,
+            'End_TVL':    end_tvl,
+            'Delta':      end_tvl - start_tvl,
+            'Pct_Change': pct_change
+        }, index=self.keys).sort_values('Delta', ascending=False)
+
+    def rolling_growth(self, window: Union[str, pd.Timedelta] = '1D') -> pd.DataFrame:
+        """Percent growth of each key over a trailing time window, per snapshot.
+
+        Compares each snapshot with the latest one at least window earlier; NaN where
+        there is no such snapshot or the earlier TVL is not positive.
+        """
+        times = self.timestamps.to_numpy(dtype='datetime64[ns]')
+        base = np.searchsorted(times, times - pd.Timedelta(window).to_timedelta64(), side='right') - 1
+        growth = np.full(self.tvl.shape, np.nan)
+        valid = base >= 0
+        previous = self.tvl[base[valid]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth[valid] = np.where(previous > 0, (self.tvl[valid] - previous) / previous * 100, np.nan)
+        return pd.DataFrame(growth, index=self.timestamps, columns=self.keys)
+
+    def rank_changes(self) -> pd.DataFrame:
+        """TVL rank of each key at the first and last snapshot; positive change means it moved up"""
+        if len(self.timestamps) == 0:
+            return pd.DataFrame(columns=['Start_Rank', 'End_Rank', 'Rank_Change'])
+        ranks = pd.DataFrame(self.tvl[[0, -1]].T, index=self.keys).rank(ascending=False, method='min')
+        ranks.columns = ['Start_Rank', 'End_Rank']
+        ranks['Rank_Change'] = ranks['Start_Rank'] - ranks['End_Rank']
+        return ranks.sort_values('Rank_Change', ascending=False)
@@ -0,0 +1,263 @@
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+from loader import ensure_dataframe
+from stats import TVL_BIN_EDGES
+
+STATE_VERSION = 2
+
+def _split_functions(value) -> list:
+    """Function names of one row, as counted by stats.generate_stats_report"""
+    if not isinstance(value, str):
+        return []
+    return value.split('\n')
+
+def _rows_path(path: Path, generation: int) -> Path:
+    return path.with_name(f"{path.name}.{generation}.rows.json")
+
+class AggregateState:
+    """Persisted aggregates that absorb append-only deltas without rescanning the dataset.
+
+    Deltas are upserted by protocol: every protocol named in a delta has all of its
+    previous rows retracted and the delta's rows added, so every update is
+    reversible and the state equals a full recompute over the latest rows of
+    each protocol (several rows per name count as several rows, as in
+    generate_stats_report). Rows without a protocol name cannot be upserted and
+    are skipped.
+
+    The aggregates are saved as they are; the per-protocol rows needed for
+    retractions and the TVL values behind the median go to a sidecar file that is
+    only read when an update needs it.
+    """
+
+    def __init__(self):
+        # protocol -> list of [category, subcategory, tvl, functions] rows
+        self.protocols     = {}
+        self.row_count     = 0
+        # (category, subcategory) -> [tvl sum, protocol count]
+        self.groups        = {}
+        self.categories    = Counter()
+        self.subcategories = Counter()
+        self.functions     = Counter()
+        self.histogram     = np.zeros(len(TVL_BIN_EDGES) - 1, dtype=np.int64)
+        self.tvl_sum       = 0.0
+        # Sorted TVL values for the median; additions and retractions are
+        # batched and folded in with one vectorized pass when the median is needed
+        self.sorted_tvl    = np.array([], dtype=float)
+        self._pending      = []
+        self._retracted    = []
+        self._median       = None
+        # Sidecar with protocols and sorted_tvl of a loaded state, read on first use
+        self._rows_source  = None
+
+    @classmethod
+    def from_frame(cls, data: Union[str, Path, pd.DataFrame]) -> 'AggregateState':
+        state = cls()
+        state.apply_delta(data)
+        return state
+
+    def __len__(self):
+        return self.row_count
+
+    def _load_rows(self):
+        if self._rows_source is None:
+            return
+        with open(self._rows_source) as f:
+            payload = json.load(f)
+        self.protocols = payload['protocols']
+        self.sorted_tvl = np.asarray(payload['sorted_tvl'], dtype=float)
+        self._rows_source = None
+
+    @staticmethod
+    def _decrement(counter: Counter, key):
+        counter[key] -= 1
+        if counter[key] <= 0:
+            del counter[key]
+
+    def _histogram_bin(self, tvl: float):
+        if tvl <= 0:
+            return None
+        return int(np.searchsorted(TVL_BIN_EDGES, tvl, side='right')) - 1
+
+    def _add_row(self, category, subcategory, tvl, functions):
+        self.row_count += 1
+        self.tvl_sum += tvl
+        self._pending.append(tvl)
+        if category is not None:
+            self.categories[category] += 1
+        if subcategory is not None:
+            self.subcategories[subcategory] += 1
+        self.functions.update(set(functions))
+        if category is not None and subcategory is not None:
+            group = self.groups.setdefault((category, subcategory), [0.0, 0])
+            group[0] += tvl
+            group[1] += 1
+        bin_index = self._histogram_bin(tvl)
+        if bin_index is not None:
+            self.histogram[bin_index] += 1
+
+    def _retract_row(self, category, subcategory, tvl, functions):
+        self.row_count -= 1
+        self.tvl_sum -= tvl
+        self._retracted.append(tvl)
+        if category is not None:
+            self._decrement(self.categories, category)
+        if subcategory is not None:
+            self._decrement(self.subcategories, subcategory)
+        for name in set(functions):
+            self._decrement(self.functions, name)
+        if category is not None and subcategory is not None:
+            group = self.groups[(category, subcategory)]
+            group[0] -= tvl
+            group[1] -= 1
+            if group[1] == 0:
+                del self.groups[(category, subcategory)]
+        bin_index = self._histogram_bin(tvl)
+        if bin_index is not None:
+            self.histogram[bin_index] -= 1
+        if not self.row_count:
+            # Drop accumulated float error once nothing is left
+            self.tvl_sum = 0.0
+
+    def _replace(self, protocol, rows: list):
+        for row in self.protocols.pop(protocol, []):
+            self._retract_row(*row)
+        for row in rows:
+            self._add_row(*row)
+        if rows:
+            self.protocols[protocol] = rows
+        self._median = None
+
+    def apply_delta(self, delta: Union[str, Path, pd.DataFrame]):
+        """Upsert the rows of every protocol in a normalized frame or a CSV path"""
+        delta = ensure_dataframe(delta)
+        columns = [delta[name] if name in delta.columns else pd.Series(None, index=delta.index)
+                   for name in ('protocol', 'category', 'subcategory', 'tvl', 'function')]
+        rows, skipped = {}, 0
+        for protocol, category, subcategory, tvl, function in zip(*columns):
+            if pd.isna(protocol):
+                skipped += 1
+                continue
+            rows.setdefault(str(protocol), []).append([
+                None if pd.isna(category) else category,
+                None if pd.isna(subcategory) else subcategory,
+                float(tvl),
+                _split_functions(function)
+            ])
+        if skipped:
+            logging.warning(f"Skipped {skipped} delta rows without a protocol name")
+        self._load_rows()
+        for protocol, protocol_rows in rows.items():
+            self._replace(protocol, protocol_rows)
+
+    def remove(self, protocols: Iterable[str]):
+        """Retract protocols that disappeared from the source"""
+        self._load_rows()
+        for protocol in protocols:
+            if protocol in self.protocols:
+                self._replace(protocol, [])
+            else:
+                logging.warning(f"Cannot retract unknown protocol {protocol}")
+
+    def _fold_pending(self):
+        if not self._pending and not self._retracted:
+            return
+        self._load_rows()
+        values = np.sort(np.concatenate([self.sorted_tvl, np.asarray(self._pending, dtype=float)]))
+        if self._retracted:
+            retracted = np.sort(np.asarray(self._retracted, dtype=float))
+            # k-th copy of a retracted value removes the k-th equal value
+            copy_index = np.arange(len(retracted)) - np.searchsorted(retracted, retracted, side='left')
+            values = np.delete(values, np.searchsorted(values, retracted, side='left') + copy_index)
+        self.sorted_tvl, self._pending, self._retracted = values, [], []
+
+    def median_tvl(self) -> float:
+        if self._median is None:
+            self._fold_pending()
+            n = len(self.sorted_tvl)
+            self._median = float((self.sorted_tvl[(n - 1) // 2] + self.sorted_tvl[n // 2]) / 2) if n else float('nan')
+        return self._median
+
+    def stats_report(self) -> dict:
+        """Same figures as stats.generate_stats_report"""
+        n = self.row_count
+        return {
+            'Total Protocols': n,
+            'Total TVL': self.tvl_sum,
+            'Average TVL': self.tvl_sum / n if n else float('nan'),
+            'Median TVL': self.median_tvl(),
+            'Categories': len(self.categories),
+            'Subcategories': len(self.subcategories),
+            'Functions': len(self.functions)
+        }
+
+    def composability(self) -> pd.DataFrame:
+        """Same table as opportunities.analyze_composability"""
+        rows = [(category, subcategory, tvl_sum, count)
+                for (category, subcategory), (tvl_sum, count) in sorted(self.groups.items())]
+        composability = pd.DataFrame(rows, columns=['Category', 'Subcategory', 'Total_TVL', 'Protocol_Count'])
+        composability['Avg_TVL'] = composability['Total_TVL'] / composability['Protocol_Count']
+        return composability.sort_values('Total_TVL', ascending=False)
+
+    def save(self, path: Union[str, Path]):
+        """Persist the aggregates as JSON, with the protocol rows in a generation-numbered sidecar"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        previous = None
+        if path.exists():
+            with open(path) as f:
+                previous = json.load(f).get('generation')
+        generation = (previous or 0) + 1
+        median = self.median_tvl()
+        self._load_rows()
+
+        # Sidecar first: the aggregate file only ever points at a complete sidecar
+        for target, payload in (
+            (_rows_path(path, generation), {'protocols': self.protocols, 'sorted_tvl': self.sorted_tvl.tolist()}),
+            (path, {
+                'version':       STATE_VERSION,
+                'generation':    generation,
+                'row_count':     self.row_count,
+                'tvl_sum':       self.tvl_sum,
+                'median_tvl':    median,
+                'groups':        [[category, subcategory, tvl_sum, count]
+                                  for (category, subcategory), (tvl_sum, count) in self.groups.items()],
+                'categories':    self.categories,
+                'subcategories': self.subcategories,
+                'functions':     self.functions,
+                'histogram':     self.histogram.tolist()
+            })
+        ):
+            tmp_path = target.with_suffix(target.suffix + '.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f)
+            tmp_path.replace(target)
+        if previous is not None and previous != generation:
+            _rows_path(path, previous).unlink(missing_ok=True)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'AggregateState':
+        """Read the saved aggregates; protocol rows are only read once an update needs them"""
+        path = Path(path)
+        with open(path) as f:
+            payload = json.load(f)
+        if payload.get('version') != STATE_VERSION:
+            raise ValueError(f"Unsupported aggregate state version in {path}")
+        state = cls()
+        state.row_count = payload['row_count']
+        state.tvl_sum = payload['tvl_sum']
+        state._median = payload['median_tvl']
+        state.groups = {(category, subcategory): [tvl_sum, count]
+                        for category, subcategory, tvl_sum, count in payload['groups']}
+        state.categories = Counter(payload['categories'])
+        state.subcategories = Counter(payload['subcategories'])
+        state.functions = Counter(payload['functions'])
+        state.histogram = np.asarray(payload['histogram'], dtype=np.int64)
+        state._rows_source = _rows_path(path, payload['generation'])
+        return state
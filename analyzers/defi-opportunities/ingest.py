@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from pathlib import Path
+from typing import List, Optional
+
+import aiohttp
+import pandas as pd
+
+DEFAULT_BASE_URL = 'https://api.llama.fi'
+DEFAULT_CACHE_DIR = Path('.http_cache')
+DEFAULT_CONCURRENCY = 16
+
+# Retry policy for connection errors, timeouts, 429 and 5xx responses
+MAX_RETRIES = 4
+BACKOFF_BASE_S = 0.5
+BACKOFF_MAX_S = 30.0
+REQUEST_TIMEOUT_S = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Output columns, in the order of the scraped CSV the analyzers were written for
+INGEST_COLUMNS = ['protocol', 'category', 'subcategory', 'tvl', 'function', 'what can be done today']
+
+class HTTPCache:
+    """On-disk response cache keyed by URL, storing the body with its ETag and Last-Modified"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.cache_dir / f'{key}.body', self.cache_dir / f'{key}.meta.json'
+
+    def get(self, url: str):
+        """(validators, body) for a cached URL, or (None, None)"""
+        body_path, meta_path = self._paths(url)
+        if not (body_path.exists() and meta_path.exists()):
+            return None, None
+        return json.loads(meta_path.read_text()), body_path.read_bytes()
+
+    def put(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        if not etag and not last_modified:
+            return
+        body_path, meta_path = self._paths(url)
+        # Body first, then metadata: a metadata file always refers to a complete body
+        for path, content in ((body_path, body),
+                              (meta_path, json.dumps({'url': url, 'etag': etag, 'last_modified': last_modified}).encode())):
+            tmp_path = path.with_name(f'.{path.name}.tmp')
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, path)
+
+class DefiLlamaClient:
+    """Pooled async client for the DefiLlama API with bounded concurrency, retries and conditional requests"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, cache_dir: Path = DEFAULT_CACHE_DIR,
+                 concurrency: int = DEFAULT_CONCURRENCY, max_retries: int = MAX_RETRIES):
+        self.base_url    = base_url.rstrip('/')
+        self.cache       = HTTPCache(cache_dir) if cache_dir else None
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.semaphore   = asyncio.Semaphore(concurrency)
+        self.session     = None
+        self.counters    = {'requests': 0, 'not_modified': 0, 'retries': 0}
+
+    async def __aenter__(self):
+        # One connection pool for the whole run; keep-alive connections are reused across requests
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.concurrency)
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_S)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_S)
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** attempt))
+
+    async def get_json(self, path: str):
+        """GET base_url + path as JSON, revalidating cached responses with If-None-Match / If-Modified-Since"""
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        validators, cached_body = self.cache.get(url) if self.cache else (None, None)
+        headers = {}
+        if validators:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self.semaphore:
+                    self.counters['requests'] += 1
+                    async with self.session.get(url, headers=headers) as response:
+                        if response.status == 304 and cached_body is not None:
+                            self.counters['not_modified'] += 1
+                            return json.loads(cached_body)
+                        if response.status == 304:
+                            # Nothing cached to reuse (e.g. the cache was cleared): fetch the full body instead
+                            headers = {}
+                            continue
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            body = await response.read()
+                            if self.cache:
+                                self.cache.put(url, body, response.headers.get('ETag'),
+                                               response.headers.get('Last-Modified'))
+                            return json.loads(body)
+                        retry_after = response.headers.get('Retry-After')
+                        error = f"HTTP {response.status}"
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {str(e)}"
+            if attempt == self.max_retries:
+                raise aiohttp.ClientError(f"GET {url} failed after {attempt + 1} attempts: {error}")
+            self.counters['retries'] += 1
+            delay = self._backoff(attempt, retry_after)
+            logging.debug(f"GET {url} failed ({error}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        raise aiohttp.ClientError(f"GET {url} answered 304 Not Modified with nothing cached")
+
+def description_fragments(description: str) -> str:
+    """Split a free-text description into one sentence per line, like the scraped function lists"""
+    sentences = re.split(r'(?<=[.!?])\s+|\n', description or '')
+    return '\n'.join(sentence.strip().rstrip('.') for sentence in sentences if sentence.strip())
+
+def protocol_row(summary: dict, detail: Optional[dict], chain: str) -> dict:
+    """One output row from the /protocols summary and, when available, the /protocol/{slug} detail"""
+    detail = detail or {}
+    # DefiLlama has no function lists; the description's sentences stand in for them
+    functions = description_fragments(detail.get('description') or summary.get('description'))
+    chain_tvls = detail.get('currentChainTvls') or summary.get('chainTvls') or {}
+    tags = detail.get('tags') or summary.get('tags') or []
+    category = detail.get('category') or summary.get('category')
+    return {
+        'protocol':               summary.get('name'),
+        'category':               category,
+        # DefiLlama has no subcategory; its first tag is the closest equivalent
+        'subcategory':            tags[0] if tags else category,
+        'tvl':                    chain_tvls.get(chain, 0.0),
+        'function':               functions,
+        'what can be done today': functions
+    }
+
+async def fetch_chain_protocols(client: DefiLlamaClient, chain: str, limit: int = None) -> List[dict]:
+    """Rows for every protocol deployed on chain, fetching protocol details concurrently"""
+    protocols = [protocol for protocol in await client.get_json('/protocols')
+                 if chain in (protocol.get('chains') or [])]
+    protocols.sort(key=lambda protocol: protocol.get('chainTvls', {}).get(chain, 0), reverse=True)
+    if limit:
+        protocols = protocols[:limit]
+    logging.info(f"Fetching details for {len(protocols):,} {chain} protocols")
+
+    async def fetch_detail(summary):
+        try:
+            return await client.get_json(f"/protocol/{summary['slug']}")
+        except Exception as e:
+            # A missing detail page only loses the richer fields; the summary still has name, category and TVL
+            logging.warning(f"Using summary data for {summary.get('name')}: {str(e)}")
+            return None
+
+    details = await asyncio.gather(*(fetch_detail(summary) for summary in protocols))
+    return [protocol_row(summary, detail, chain) for summary, detail in zip(protocols, details)]
+
+async def ingest_async(chain: str = 'Solana', base_url: str = DEFAULT_BASE_URL, cache_dir: Path = DEFAULT_CACHE_DIR,
+                       concurrency: int = DEFAULT_CONCURRENCY, limit: int = None) -> pd.DataFrame:
+    async with DefiLlamaClient(base_url, cache_dir, concurrency) as client:
+        rows = await fetch_chain_protocols(client, chain, limit)
+        logging.info(f"{client.counters['requests']} requests, {client.counters['not_modified']} not modified, "
+                     f"{client.counters['retries']} retries")
+    return pd.DataFrame(rows, columns=INGEST_COLUMNS)
+
+def ingest(output_path: Path, chain: str = 'Solana', base_url: str = DEFAULT_BASE_URL,
+           cache_dir: Path = DEFAULT_CACHE_DIR, concurrency: int = DEFAULT_CONCURRENCY,
+           limit: int = None) -> pd.DataFrame:
+    """Fetch a chain's protocols and write them as a CSV the analyzers can load"""
+    try:
+        df = asyncio.run(ingest_async(chain, base_url, cache_dir, concurrency, limit))
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(f'.{output_path.name}.tmp')
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, output_path)
+        logging.info(f"Wrote {len(df):,} protocols to {output_path}")
+        return df
+    except Exception as e:
+        logging.error(f"Ingestion failed: {str(e)}")
+        raise
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch a chain\'s protocols from the DefiLlama API into a CSV')
+    parser.add_argument('--chain', default='Solana')
+    parser.add_argument('--output', type=Path, default=Path('solana.csv'))
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='API root, e.g. a local stub server')
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--limit', type=int, help='Only the N protocols with the highest TVL on the chain')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ingest(args.output, args.chain, args.base_url, args.cache_dir, args.concurrency, args.limit)
+
+if __name__ == "__main__":
+    main()
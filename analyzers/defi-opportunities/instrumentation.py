@@ -0,0 +1,138 @@
+import cProfile
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Union
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Recorder that module-level stage() calls report to; None disables instrumentation
+_active_recorder = None
+
+def _cpu_seconds():
+    """CPU time of this process and of its finished child processes"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+def _max_rss_mb():
+    """Process-lifetime high-water mark of the resident set size, in MB"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class StageRecorder:
+    """Records wall time, CPU time and memory for each named pipeline stage.
+
+    peak_rss_mb is the process peak so far and peak_rss_growth_mb how much the
+    stage raised it. trace_memory adds a tracemalloc peak per stage (slower);
+    profile_dir dumps one cProfile file per stage.
+    """
+
+    def __init__(self, trace_memory: bool = False, profile_dir: Path = None):
+        self.trace_memory = trace_memory
+        self.profile_dir  = Path(profile_dir) if profile_dir else None
+        self.stages       = []
+
+    @contextmanager
+    def stage(self, name: str):
+        record = {'stage': name, 'status': 'ok'}
+        profiler = cProfile.Profile() if self.profile_dir else None
+        tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        wall_start, cpu_start, rss_start = time.perf_counter(), _cpu_seconds(), _max_rss_mb()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        except BaseException as e:
+            record['status'] = 'error'
+            record['error'] = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            record['wall_s'] = time.perf_counter() - wall_start
+            record['cpu_s'] = _cpu_seconds() - cpu_start
+            record['peak_rss_mb'] = _max_rss_mb()
+            record['peak_rss_growth_mb'] = record['peak_rss_mb'] - rss_start if rss_start is not None else None
+            if tracing:
+                record['traced_peak_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+                tracemalloc.stop()
+            if profiler:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profile_path = self.profile_dir / f"{name.replace(' ', '_').replace(':', '_')}.prof"
+                profiler.dump_stats(profile_path)
+                record['profile'] = str(profile_path)
+            self.add(record)
+
+    def add(self, record: dict):
+        """Store a finished stage record, e.g. one measured in a worker process"""
+        self.stages.append(record)
+        logger.info(json.dumps(record))
+
+    @contextmanager
+    def activate(self):
+        """Make this recorder the target of module-level stage() calls"""
+        global _active_recorder
+        previous, _active_recorder = _active_recorder, self
+        try:
+            yield self
+        finally:
+            _active_recorder = previous
+
+    def to_dict(self) -> dict:
+        return {
+            'total_wall_s': sum(record['wall_s'] for record in self.stages),
+            'stages':       self.stages
+        }
+
+    def write_json(self, path: Union[str, Path]):
+        Path(path).write_text(json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path: Union[str, Path], job: str = 'defi_opportunities'):
+        """Write a node_exporter textfile-collector file; written atomically so scrapes never see half a file"""
+        metrics = [
+            ('wall_seconds', 'wall_s', 'Wall-clock time spent in the stage'),
+            ('cpu_seconds', 'cpu_s', 'CPU time spent in the stage'),
+            ('peak_rss_megabytes', 'peak_rss_mb', 'Process peak resident set size at the end of the stage'),
+            ('peak_rss_growth_megabytes', 'peak_rss_growth_mb', 'Growth of the process peak resident set size during the stage'),
+            ('traced_peak_megabytes', 'traced_peak_mb', 'tracemalloc peak during the stage')
+        ]
+        lines = []
+        for metric, key, help_text in metrics:
+            name = f'{job}_stage_{metric}'
+            samples = [
+                f'{name}{{stage="{record["stage"]}",status="{record["status"]}"}} {record[key]}'
+                for record in self.stages if record.get(key) is not None
+            ]
+            if samples:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge'] + samples
+        path = Path(path)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        tmp_path.write_text('\n'.join(lines) + '\n')
+        tmp_path.replace(path)
+
+@contextmanager
+def stage(name: str):
+    """Record a stage on the active recorder, or do nothing when none is active"""
+    if _active_recorder is None:
+        yield None
+    else:
+        with _active_recorder.stage(name) as record:
+            yield record
+
+def record_stage(record: dict):
+    """Hand a stage measured elsewhere (e.g. a worker process) to the active recorder"""
+    if _active_recorder is not None:
+        _active_recorder.add(record)
@@ -0,0 +1,149 @@
+import hashlib
+import logging
+from pathlib import Path
+from typing import Union
+
+import pandas as pd
+
+from instrumentation import stage
+
+logger = logging.getLogger(__name__)
+
+# Columns with few distinct values that are stored as categoricals
+CATEGORICAL_COLUMNS = ['category', 'subcategory']
+
+# Free-text columns, stored as Arrow-backed strings instead of Python objects
+TEXT_COLUMNS = ['protocol', 'function', 'what can be done today']
+
+# TVL stays float64: float32 keeps ~7 significant digits, too few for sums of
+# multi-billion TVLs quoted to the cent
+FLOAT64_COLUMNS = ['tvl']
+
+# Other object columns become categoricals when at most this share of values is distinct
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+SNAPSHOT_DIR_NAME = '.snapshots'
+
+# Part of every snapshot key; bump whenever normalize_dataframe or the dtype plan
+# changes, so snapshots written by the old normalization are not served
+LOADER_SCHEMA_VERSION = 2
+
+def clean_tvl_column(tvl: pd.Series) -> pd.Series:
+    """Vectorized TVL cleaning: strip '$' and ',' and coerce to float (invalid -> 0)"""
+    if pd.api.types.is_numeric_dtype(tvl):
+        return tvl.astype(float).fillna(0.0)
+    return pd.to_numeric(
+        tvl.astype('string').str.replace(r'[\$,]', '', regex=True),
+        errors='coerce'
+    ).fillna(0.0).astype(float)
+
+def string_dtype():
+    """Arrow-backed string dtype, or pandas' Python string dtype without pyarrow"""
+    try:
+        import pyarrow  # noqa: F401
+        return pd.StringDtype('pyarrow')
+    except ImportError:
+        return pd.StringDtype('python')
+
+def downcast_numeric(column: pd.Series) -> pd.Series:
+    """Store floats as float32 when no value changes; integers keep int64"""
+    if pd.api.types.is_float_dtype(column):
+        narrowed = column.astype('float32')
+        if ((narrowed.astype('float64') == column) | column.isna()).all():
+            return narrowed
+    return column
+
+def apply_dtype_plan(df: pd.DataFrame) -> pd.DataFrame:
+    """Give every column an explicit compact dtype: categoricals for low-cardinality
+    columns, Arrow strings for text, float64 TVL and lossless downcasts for other numbers"""
+    text_dtype = string_dtype()
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].astype('category')
+        elif column in TEXT_COLUMNS:
+            df[column] = df[column].astype(text_dtype)
+        elif column in FLOAT64_COLUMNS:
+            df[column] = df[column].astype('float64')
+        elif pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column]):
+            df[column] = downcast_numeric(df[column])
+        elif df[column].dtype == object:
+            unique_ratio = df[column].nunique() / max(len(df), 1)
+            if unique_ratio <= CATEGORICAL_MAX_UNIQUE_RATIO:
+                df[column] = df[column].astype('category')
+            else:
+                df[column] = df[column].astype(text_dtype)
+    return df
+
+def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """Lowercase column names, clean TVL and apply the dtype plan"""
+    df.columns = df.columns.str.strip().str.lower()
+    if 'tvl' in df.columns:
+        df['tvl'] = clean_tvl_column(df['tvl'])
+    return apply_dtype_plan(df)
+
+def file_fingerprint(csv_path: Path) -> str:
+    """Hash of the file contents combined with its modification time and the loader schema version"""
+    digest = hashlib.sha256(f"schema-{LOADER_SCHEMA_VERSION}".encode())
+    with open(csv_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(str(csv_path.stat().st_mtime_ns).encode())
+    return digest.hexdigest()[:16]
+
+def snapshot_path(csv_path: Path, cache_dir: Path = None) -> Path:
+    """Location of the columnar snapshot for the current version of csv_path"""
+    cache_dir = Path(cache_dir) if cache_dir else csv_path.parent / SNAPSHOT_DIR_NAME
+    return cache_dir / f'{csv_path.stem}-{file_fingerprint(csv_path)}.parquet'
+
+def load_dataset(csv_path: Union[str, Path], cache_dir: Path = None, use_cache: bool = True) -> pd.DataFrame:
+    """Parse and normalize the scraped CSV once, reusing a Parquet snapshot when the file is unchanged"""
+    csv_path = Path(csv_path)
+    snapshot = None
+    if use_cache:
+        # Hashing the whole file is a cost of its own on large inputs
+        with stage('fingerprint'):
+            snapshot = snapshot_path(csv_path, cache_dir)
+
+    if snapshot is not None and snapshot.exists():
+        with stage('load_snapshot') as record:
+            try:
+                df = pd.read_parquet(snapshot)
+            except Exception as e:
+                # Not a pipeline error: the CSV is parsed below instead
+                logger.warning(f"Ignoring unreadable snapshot {snapshot}: {str(e)}")
+                df = None
+                if record is not None:
+                    record['status'] = 'fallback'
+                    record['error'] = f"{type(e).__name__}: {str(e)}"
+        if df is not None:
+            logger.info(f"Loaded cached snapshot {snapshot}")
+            return df
+
+    try:
+        with stage('load'):
+            df = pd.read_csv(csv_path)
+        with stage('clean'):
+            df = normalize_dataframe(df)
+    except Exception as e:
+        logger.error(f"Error processing CSV file {csv_path}: {str(e)}")
+        raise
+
+    if snapshot is not None:
+        try:
+            snapshot.parent.mkdir(parents=True, exist_ok=True)
+            # Drop snapshots of older versions of the same file
+            for stale in snapshot.parent.glob(f"{csv_path.stem}-{'?' * 16}.parquet"):
+                stale.unlink()
+            df.to_parquet(snapshot, index=False)
+            logger.info(f"Saved snapshot {snapshot}")
+        except Exception as e:
+            # Snapshots are an optimization only (e.g. pyarrow not installed)
+            logger.warning(f"Could not write snapshot {snapshot}: {str(e)}")
+
+    return df
+
+def ensure_dataframe(data: Union[str, Path, pd.DataFrame]) -> pd.DataFrame:
+    """Accept either an already-loaded frame or a path to the CSV"""
+    if isinstance(data, pd.DataFrame):
+        return data
+    return load_dataset(data)
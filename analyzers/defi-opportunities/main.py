@@ -2,10 +2,16 @@
 # source venv/bin/activate
 # pip install -r requirements.txt
 import logging
+import os
 import sys
 from pathlib import Path
 from charts import generate_all_charts
-from stats import generate_stats_report
+from history import SnapshotStore
+from instrumentation import StageRecorder, stage
+from loader import load_dataset
+from report import ReportWriter
+from resolve import merge_protocol_entities, plan_protocol_merges
+from stats import generate_distribution_report, generate_stats_report
 
 def setup_logging():
     logging.basicConfig(
@@ -16,78 +22,120 @@ def setup_logging():
         ]
     )
 
-def main():
+def run_pipeline(csv_path: Path, base_output_dir: Path, charts_dir: Path, chart_workers: int = None,
+                 resolve_entities: bool = False):
+    """Load the data and write charts, cleaned CSV and report, recording each step as a stage.
+
+    resolve_entities=True merges near-duplicate protocol names (see resolve.py)
+    and lists the merges in the report. Returns the loaded frame.
+    """
+    logger = logging.getLogger(__name__)
+
+    # Parse and normalize the CSV once; every analyzer reuses this frame
+    df = load_dataset(csv_path)
+
+    # Merged multi-source scrapes list one protocol under several names; stats and charts need one row each
+    merges = None
+    if resolve_entities:
+        with stage('resolve_entities'):
+            merges = plan_protocol_merges(df)
+            for category, protocol, canonical in merges.itertuples(index=False):
+                logger.info(f"Merging '{protocol}' into '{canonical}' ({category})")
+            df = merge_protocol_entities(df, plan=merges)
+    logger.info(f"Available columns: {df.columns.tolist()}")
+
+    logger.info("Generating report...")
+    report = ReportWriter(base_output_dir / 'analysis', 'DeFi Opportunities Analysis')
+    with report:
+        # Add charts section
+        charts = generate_all_charts(df, charts_dir, workers=chart_workers)  # Reuse the loaded frame
+        report.heading("Charts")
+        for chart_title, chart_path in charts.items():
+            # Use relative path for the report
+            report.image(chart_title, Path(chart_path).relative_to(base_output_dir))
+
+        if merges is not None:
+            report.heading("Merged Protocol Names")
+            report.text(f"{len(merges):,} protocol names were merged into the canonical name of their entity.")
+            if len(merges):
+                report.table(merges)
+
+        # Add stats section
+        logger.info("Adding stats to report...")
+        with stage('stats'):
+            stats = generate_stats_report(df)
+            distribution = generate_distribution_report(df)
+        report.heading("Statistics")
+        report.stats(stats)
+        for level, level_stats in distribution.groupby('Level', sort=False):
+            report.heading(f"TVL Distribution by {level.title()}", level=3)
+            report.table(level_stats.drop(columns='Level'))
+
+        # Save the cleaned CSV
+        cleaned_csv_path = base_output_dir / 'cleaned_data.csv'
+        with stage('write_csv'):
+            df.to_csv(cleaned_csv_path, index=False)
+        logger.info(f"Saved cleaned data to {cleaned_csv_path}")
+
+        # Binary copy keeps the dtype plan and is much faster for downstream jobs to re-read
+        cleaned_parquet_path = base_output_dir / 'cleaned_data.parquet'
+        with stage('write_parquet'):
+            try:
+                df.to_parquet(cleaned_parquet_path, index=False)
+                logger.info(f"Saved cleaned data to {cleaned_parquet_path}")
+            except ImportError as e:
+                # pyarrow is optional, as for the loader's snapshots; the CSV above has the same data
+                logger.warning(f"Could not write {cleaned_parquet_path}: {str(e)}")
+
+        # cleaned_data.* is overwritten each run; the snapshot store keeps every run for growth analysis
+        with stage('append_history'):
+            try:
+                SnapshotStore(base_output_dir / 'history').append(df)
+            except ImportError as e:
+                logger.warning(f"Could not append to the snapshot history: {str(e)}")
+
+    logger.info(f"Analysis complete! Check {report.path('md')} for the report.")
+    return df
+
+def main(prometheus_path: Path = None, profile_dir: Path = None, trace_memory: bool = False,
+         resolve_entities: bool = False):
+    """Run the report; per-stage metrics go to metrics.json and optionally a Prometheus textfile"""
     setup_logging()
     logger = logging.getLogger(__name__)
-    
+    recorder = StageRecorder(trace_memory=trace_memory, profile_dir=profile_dir)
+
     # Configure paths - using relative path from current directory
     base_output_dir = Path('output/solana-defi-llama-scraped')  # Changed to be relative to current directory
     base_output_dir.mkdir(parents=True, exist_ok=True)
-    
+
     # Create subdirectories
     charts_dir = base_output_dir / 'charts'
     charts_dir.mkdir(exist_ok=True)
-    
+
     csv_path = Path('solana.csv')
     if not csv_path.exists():
         logger.error(f"Could not find data file at {csv_path}")
         sys.exit(1)
-    
+
     try:
-        # Debug: Print column names
-        import pandas as pd
-        df = pd.read_csv(str(csv_path))
-        logger.info(f"Available columns: {df.columns.tolist()}")
-        
-        # Clean and prepare the TVL data
-        def clean_tvl(tvl_str):
-            if isinstance(tvl_str, str):
-                return float(tvl_str.replace('$', '').replace(',', ''))
-            return 0.0
-            
-        # Convert column names to lowercase and clean TVL data
-        df.columns = df.columns.str.lower()
-        df['tvl'] = df['tvl'].apply(clean_tvl)
-        
-        # Generate markdown content
-        logger.info("Generating markdown report...")
-        markdown_content = "# DeFi Opportunities Analysis\n\n"
-        
-        # Add charts section
-        markdown_content += "## Charts\n\n"
-        charts = generate_all_charts(csv_path, charts_dir)  # Pass Path object directly
-        for chart_title, chart_path in charts.items():
-            # Use relative path for markdown
-            relative_path = Path(chart_path).relative_to(base_output_dir)
-            markdown_content += f"### {chart_title}\n"
-            markdown_content += f"![{chart_title}]({relative_path})\n\n"
-        
-        # Add stats section
-        logger.info("Adding stats to report...")
-        stats = generate_stats_report(df)
-        markdown_content += "## Statistics\n\n"
-        # Format the stats dictionary into markdown
-        for key, value in stats.items():
-            if isinstance(value, (int, float)):
-                markdown_content += f"- **{key}:** {value:,.2f}\n"
-            else:
-                markdown_content += f"- **{key}:** {value}\n"
-        
-        # Save the cleaned CSV
-        cleaned_csv_path = base_output_dir / 'cleaned_data.csv'
-        df.to_csv(cleaned_csv_path, index=False)
-        logger.info(f"Saved cleaned data to {cleaned_csv_path}")
-        
-        # Write markdown file
-        output_path = base_output_dir / 'analysis.md'
-        with open(output_path, 'w') as f:
-            f.write(markdown_content)
-        
-        logger.info(f"Analysis complete! Check {output_path} for the report.")
-        
+        with recorder.activate():
+            run_pipeline(csv_path, base_output_dir, charts_dir, resolve_entities=resolve_entities)
     except Exception as e:
-        logger.error(f"An error occurred during analysis: {str(e)}")
+        failed = [record['stage'] for record in recorder.stages if record['status'] == 'error']
+        stage_info = f" in stage '{failed[0]}'" if failed else ""
+        logger.error(f"An error occurred during analysis{stage_info}: {str(e)}")
         sys.exit(1)
+    finally:
+        recorder.write_json(base_output_dir / 'metrics.json')
+        if prometheus_path:
+            recorder.write_prometheus(prometheus_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Optional instrumentation for scheduled runs
+    main(
+        prometheus_path=os.environ.get('DEFI_METRICS_PROM'),
+        profile_dir=os.environ.get('DEFI_PROFILE_DIR'),
+        trace_memory=os.environ.get('DEFI_TRACE_MEMORY') == '1',
+        # Opt-in: merging changes protocol counts, TVL totals, cleaned data and history
+        resolve_entities=os.environ.get('DEFI_RESOLVE_ENTITIES') == '1'
+    )
@@ -1,71 +1,155 @@
 import pandas as pd
 import numpy as np
-from typing import List, Tuple
-import matplotlib.pyplot as plt
-import seaborn as sns
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from loader import load_dataset
+from tvl_index import TVLIndex
 
 def load_and_preprocess_data(csv_path: str) -> pd.DataFrame:
     """Load and preprocess data from CSV file."""
     try:
-        # Read CSV file directly from path
-        df = pd.read_csv(csv_path)
-        
-        # Clean TVL column - remove $ and commas, convert to float
-        df['TVL'] = df['TVL'].replace({'\$': '', ',': ''}, regex=True).astype(float)
-        
-        return df
+        return load_dataset(csv_path)
     except Exception as e:
         raise Exception(f"Error loading CSV file: {str(e)}")
 
 def analyze_composability(df: pd.DataFrame) -> pd.DataFrame:
-    composability = df.groupby(['Category', 'Subcategory']).agg({
-        'TVL': 'sum',
-        'Protocol': 'count'
+    composability = df.groupby(['category', 'subcategory'], observed=True).agg({
+        'tvl': 'sum',
+        'protocol': 'count'
     }).reset_index()
     composability.columns = ['Category', 'Subcategory', 'Total_TVL', 'Protocol_Count']
     composability['Avg_TVL'] = composability['Total_TVL'] / composability['Protocol_Count']
     return composability.sort_values('Total_TVL', ascending=False)
 
-def identify_top_protocols(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
-    return df.nlargest(n, 'TVL')[['Protocol', 'Category', 'Subcategory', 'TVL']]
+def identify_top_protocols(df: pd.DataFrame, n: int = 5, index: TVLIndex = None) -> pd.DataFrame:
+    """Top n protocols by TVL; pass a prebuilt index to answer repeated queries without rescanning df"""
+    if index is None:
+        # One-shot query: a partial selection is cheaper than building an index
+        return df.nlargest(n, 'tvl')[['protocol', 'category', 'subcategory', 'tvl']]
+    return index.top(n)[['protocol', 'category', 'subcategory', 'tvl']]
 
-def calculate_yield_potential(composability: pd.DataFrame) -> pd.DataFrame:
-    composability['Yield_Potential'] = np.log(composability['Total_TVL']) * composability['Protocol_Count']
+# Vectorized yield scorers: composability frame -> one score per category/subcategory row
+YIELD_SCORERS: Dict[str, Callable[[pd.DataFrame], np.ndarray]] = {
+    'log_tvl_x_count':     lambda c: np.log(c['Total_TVL'].to_numpy(dtype=float)) * c['Protocol_Count'].to_numpy(dtype=float),
+    'log_avg_tvl_x_count': lambda c: np.log(c['Avg_TVL'].to_numpy(dtype=float)) * c['Protocol_Count'].to_numpy(dtype=float),
+    'sqrt_tvl_x_count':    lambda c: np.sqrt(c['Total_TVL'].to_numpy(dtype=float)) * c['Protocol_Count'].to_numpy(dtype=float),
+    'log_tvl':             lambda c: np.log(c['Total_TVL'].to_numpy(dtype=float))
+}
+
+# Scorer behind the Yield_Potential column
+DEFAULT_SCORER = 'log_tvl_x_count'
+
+Scorer = Union[str, Callable[[pd.DataFrame], np.ndarray]]
+# Scorers as a list (callables named by __name__) or as an explicit name -> scorer mapping
+Scorers = Union[Iterable[Scorer], Dict[str, Scorer]]
+
+def score_yield_batch(composability: pd.DataFrame, scorers: Scorers = None) -> pd.DataFrame:
+    """Evaluate several yield scorers at once; one column per scorer, aligned with composability"""
+    scorers = _resolve_scorers(scorers)
+    return pd.DataFrame({name: scorer(composability) for name, scorer in scorers.items()},
+                        index=composability.index)
+
+def _resolve_scorers(scorers: Scorers = None) -> Dict[str, Callable]:
+    named = scorers.items() if isinstance(scorers, dict) else \
+        [(scorer if isinstance(scorer, str) else getattr(scorer, '__name__', repr(scorer)), scorer)
+         for scorer in scorers or [DEFAULT_SCORER]]
+    resolved = {}
+    for name, scorer in named:
+        if name in resolved:
+            # Lambdas and partials share names; one column per name would silently drop a scorer
+            raise ValueError(f"Two yield scorers are named '{name}'; pass a name -> scorer mapping instead")
+        if isinstance(scorer, str):
+            if scorer not in YIELD_SCORERS:
+                raise ValueError(f"Unknown yield scorer '{scorer}', expected one of {list(YIELD_SCORERS)}")
+            scorer = YIELD_SCORERS[scorer]
+        resolved[name] = scorer
+    return resolved
+
+def calculate_yield_potential(composability: pd.DataFrame, scorer: Scorer = DEFAULT_SCORER) -> pd.DataFrame:
+    composability['Yield_Potential'] = score_yield_batch(composability, [scorer]).iloc[:, 0]
     return composability.sort_values('Yield_Potential', ascending=False)
 
-def find_composability_opportunities(composability: pd.DataFrame, threshold: float = 0.5) -> List[Tuple[str, str, str, str, float]]:
-    opportunities = []
-    for i, row1 in composability.iterrows():
-        for j, row2 in composability.iterrows():
-            if i != j:
-                synergy_score = (row1['Yield_Potential'] + row2['Yield_Potential']) / \
-                                (row1['Total_TVL'] + row2['Total_TVL'])
-                if synergy_score > threshold:
-                    opportunities.append((
-                        row1['Category'], row1['Subcategory'],
-                        row2['Category'], row2['Subcategory'],
-                        synergy_score
-                    ))
-    return sorted(opportunities, key=lambda x: x[4], reverse=True)
-
-def visualize_composability(composability: pd.DataFrame):
-    plt.figure(figsize=(12, 8))
-    sns.scatterplot(data=composability, x='Total_TVL', y='Protocol_Count', 
-                    size='Yield_Potential', hue='Category', alpha=0.7)
-    plt.xscale('log')
-    plt.title('DeFi Composability Landscape')
-    plt.xlabel('Total TVL (log scale)')
-    plt.ylabel('Number of Protocols')
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
+# Upper bound on the number of pair scores materialized per tile
+PAIR_TILE_ELEMENTS = 4_000_000
+
+def iter_pair_scores(composability: pd.DataFrame, threshold: float = 0.5, unordered: bool = False,
+                     block_size: int = None) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (i, j, score) arrays of row positions whose synergy score exceeds threshold, one tile at a time"""
+    yield_potential = composability['Yield_Potential'].to_numpy(dtype=float)
+    total_tvl = composability['Total_TVL'].to_numpy(dtype=float)
+    n = len(composability)
+    if block_size is None:
+        block_size = max(1, PAIR_TILE_ELEMENTS // max(n, 1))
+
+    columns = np.arange(n)
+    for start in range(0, n, block_size):
+        rows = np.arange(start, min(start + block_size, n))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (yield_potential[rows, None] + yield_potential[None, :]) / \
+                     (total_tvl[rows, None] + total_tvl[None, :])
+        mask = scores > threshold
+        if unordered:
+            mask &= columns[None, :] > rows[:, None]
+        else:
+            mask &= columns[None, :] != rows[:, None]
+        i, j = np.nonzero(mask)
+        yield rows[i], j, scores[i, j]
+
+def _select_top(i: np.ndarray, j: np.ndarray, scores: np.ndarray, k: int = None):
+    """Order candidates by score descending, ties in (i, j) scan order, keeping at most k"""
+    if k is not None and k <= 0:
+        return i[:0], j[:0], scores[:0]
+    if k is not None and len(scores) > k:
+        # Keep everything tied with the k-th best score so tie order stays exact
+        cutoff = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= cutoff
+        i, j, scores = i[keep], j[keep], scores[keep]
+    order = np.lexsort((j, i, -scores))[:k]
+    return i[order], j[order], scores[order]
+
+def find_composability_opportunities(composability: pd.DataFrame, threshold: float = 0.5, top_k: int = None,
+                                     unordered: bool = False, block_size: int = None) -> List[Tuple[str, str, str, str, float]]:
+    """Score every pair of category/subcategory groups in tiles, returning those above threshold best first.
+
+    With top_k only the k best pairs are kept while scanning; unordered=True drops the
+    symmetric (j, i) duplicate of every (i, j) pair.
+    """
+    parts = [(np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=float))]
+    for tile in iter_pair_scores(composability, threshold, unordered, block_size):
+        parts.append(tile)
+        if top_k is not None:
+            # Fold the tile into the running top-k so memory stays bounded
+            parts = [_select_top(*map(np.concatenate, zip(*parts)), top_k)]
+    best_i, best_j, best_scores = _select_top(*map(np.concatenate, zip(*parts)), top_k)
+
+    categories = composability['Category'].to_numpy(dtype=object)
+    subcategories = composability['Subcategory'].to_numpy(dtype=object)
+    return [
+        (categories[a], subcategories[a], categories[b], subcategories[b], float(score))
+        for a, b, score in zip(best_i, best_j, best_scores)
+    ]
+
+def visualize_composability(composability: pd.DataFrame, output_path: Path = Path('composability_landscape.png'),
+                            show: bool = False):
+    """Write the composability landscape to output_path; show=True opens an interactive window instead"""
+    # Plotting libraries are slow to import, so only load them when plotting
+    from charts import ChartGenerator, create_composability_landscape, draw_composability_landscape
+    ChartGenerator.setup_plot_style()
+    if not show:
+        return create_composability_landscape(composability, output_path)
+
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(12, 8))
+    draw_composability_landscape(ax, composability)
+    fig.tight_layout()
     plt.show()
 
-def main(csv_path: str):
-    df = load_and_preprocess_data(csv_path)
+def main(data: Union[str, pd.DataFrame]):
+    df = data if isinstance(data, pd.DataFrame) else load_and_preprocess_data(data)
     composability = analyze_composability(df)
     top_protocols = identify_top_protocols(df)
     composability_with_yield = calculate_yield_potential(composability)
-    opportunities = find_composability_opportunities(composability_with_yield)
+    opportunities = find_composability_opportunities(composability_with_yield, top_k=5)
 
     print("Top 5 Protocols by TVL:")
     print(top_protocols)
@@ -73,7 +157,8 @@ def main(csv_path: str):
     for opp in opportunities[:5]:
         print(f"{opp[0]} ({opp[1]}) + {opp[2]} ({opp[3]}) - Synergy Score: {opp[4]:.2f}")
 
-    visualize_composability(composability_with_yield)
+    landscape_path = visualize_composability(composability_with_yield)
+    print(f"\nComposability landscape saved to {landscape_path}")
 
 if __name__ == "__main__":
     csv_path = "solana.csv"  # Path to your CSV file
@@ -0,0 +1,273 @@
+import html
+import json
+import math
+import os
+from pathlib import Path
+from typing import Iterable, Union
+
+import pandas as pd
+
+REPORT_FORMATS = ('md', 'html', 'json')
+
+# Rows formatted and written per batch when streaming a table
+TABLE_WRITE_ROWS = 10_000
+
+TableSource = Union[pd.DataFrame, Iterable[pd.DataFrame]]
+
+def format_value(value) -> str:
+    """Human-readable value: thousands separators, two decimals for floats"""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, float) or (hasattr(value, 'dtype') and value.dtype.kind == 'f'):
+        return f"{value:,.2f}"
+    if isinstance(value, int) or (hasattr(value, 'dtype') and value.dtype.kind in 'iu'):
+        return f"{value:,}"
+    return str(value)
+
+def json_value(value):
+    """JSON-safe scalar: numpy scalars unwrapped, NaN and infinities as null"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def iter_table_chunks(table: TableSource) -> Iterable[pd.DataFrame]:
+    """Split a frame into write batches, or pass an iterable of chunks through"""
+    if isinstance(table, pd.DataFrame):
+        for start in range(0, len(table), TABLE_WRITE_ROWS):
+            yield table.iloc[start:start + TABLE_WRITE_ROWS]
+    else:
+        yield from table
+
+class MarkdownFormat:
+    suffix = 'md'
+
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title):
+        self.f.write(f"# {title}\n\n")
+
+    def heading(self, text, level):
+        self.f.write(f"{'#' * level} {text}\n\n")
+
+    def text(self, text):
+        self.f.write(f"{text}\n\n")
+
+    def image(self, title, path):
+        self.f.write(f"### {title}\n![{title}]({path})\n\n")
+
+    def stats(self, stats):
+        for key, value in stats.items():
+            self.f.write(f"- **{key}:** {format_value(value)}\n")
+        self.f.write("\n")
+
+    def table_start(self, columns):
+        self.f.write("| " + " | ".join(columns) + " |\n|" + "---|" * len(columns) + "\n")
+
+    def table_rows(self, rows):
+        self.f.write("".join("| " + " | ".join(format_value(value) for value in row) + " |\n" for row in rows))
+
+    def table_end(self):
+        self.f.write("\n")
+
+    def end(self):
+        pass
+
+class HTMLFormat:
+    suffix = 'html'
+
+    def __init__(self, f):
+        self.f = f
+
+    def begin(self, title):
+        self.f.write(
+            f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(title)}</title>\n"
+            "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+            "td,th{border:1px solid #ccc;padding:4px 8px;text-align:left}img{max-width:100%}</style>\n"
+            f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n"
+        )
+
+    def heading(self, text, level):
+        self.f.write(f"<h{level}>{html.escape(text)}</h{level}>\n")
+
+    def text(self, text):
+        self.f.write(f"<p>{html.escape(text)}</p>\n")
+
+    def image(self, title, path):
+        title = html.escape(title)
+        self.f.write(f"<h3>{title}</h3>\n<img src=\"{html.escape(str(path))}\" alt=\"{title}\">\n")
+
+    def stats(self, stats):
+        self.f.write("<ul>\n")
+        for key, value in stats.items():
+            self.f.write(f"<li><strong>{html.escape(str(key))}:</strong> {html.escape(format_value(value))}</li>\n")
+        self.f.write("</ul>\n")
+
+    def table_start(self, columns):
+        header = "".join(f"<th>{html.escape(str(column))}</th>" for column in columns)
+        self.f.write(f"<table>\n<thead><tr>{header}</tr></thead>\n<tbody>\n")
+
+    def table_rows(self, rows):
+        self.f.write("".join(
+            "<tr>" + "".join(f"<td>{html.escape(format_value(value))}</td>" for value in row) + "</tr>\n"
+            for row in rows
+        ))
+
+    def table_end(self):
+        self.f.write("</tbody>\n</table>\n")
+
+    def end(self):
+        self.f.write("</body>\n</html>\n")
+
+class JSONFormat:
+    """One JSON document with a flat list of blocks; table rows are written as they arrive"""
+    suffix = 'json'
+
+    def __init__(self, f):
+        self.f = f
+        self.first_block = True
+
+    def _block(self, block):
+        self.f.write(("" if self.first_block else ",\n") + json.dumps(block, default=json_value))
+        self.first_block = False
+
+    def begin(self, title):
+        self.f.write(f'{{"title": {json.dumps(title)}, "blocks": [\n')
+
+    def heading(self, text, level):
+        self._block({'type': 'heading', 'level': level, 'text': text})
+
+    def text(self, text):
+        self._block({'type': 'text', 'text': text})
+
+    def image(self, title, path):
+        self._block({'type': 'image', 'title': title, 'path': str(path)})
+
+    def stats(self, stats):
+        self._block({'type': 'stats', 'values': {str(key): json_value(value) for key, value in stats.items()}})
+
+    def table_start(self, columns):
+        # Leave the block open so rows can be appended without buffering the table
+        block = json.dumps({'type': 'table', 'columns': [str(column) for column in columns], 'rows': []})
+        self.f.write(("" if self.first_block else ",\n") + block[:-2])
+        self.first_block = False
+        self.first_row = True
+
+    def table_rows(self, rows):
+        lines = [json.dumps([json_value(value) for value in row]) for row in rows]
+        if lines:
+            self.f.write(("\n" if self.first_row else ",\n") + ",\n".join(lines))
+            self.first_row = False
+
+    def table_end(self):
+        self.f.write("]}")
+
+    def end(self):
+        self.f.write("\n]}\n")
+
+FORMAT_CLASSES = {format_class.suffix: format_class for format_class in (MarkdownFormat, HTMLFormat, JSONFormat)}
+
+class ReportWriter:
+    """Streams report sections to Markdown, HTML and JSON files as they are produced.
+
+    Every block goes to each format immediately and the files are flushed after
+    each block, so tables are never held in memory as a whole. Blocks go to a
+    temporary file next to each report, renamed into place on exit: a report on
+    disk is always a complete document, with a "Report incomplete" note if a
+    stage failed, and a killed run leaves the previous report untouched.
+    output_paths maps a format to an explicit file instead of base_path.<suffix>.
+    """
+
+    def __init__(self, base_path: Path, title: str, formats=REPORT_FORMATS, output_paths: dict = None):
+        unknown = set(formats) - set(FORMAT_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown report formats {sorted(unknown)}, expected some of {REPORT_FORMATS}")
+        self.base_path    = Path(base_path)
+        self.title        = title
+        self.formats      = formats
+        self.output_paths = {suffix: Path(path) for suffix, path in (output_paths or {}).items()}
+        self.files        = []
+        self.writers      = []
+        self._table_open  = False
+
+    def path(self, suffix: str) -> Path:
+        if suffix in self.output_paths:
+            return self.output_paths[suffix]
+        return self.base_path.with_name(f"{self.base_path.name}.{suffix}")
+
+    @staticmethod
+    def _tmp_path(path: Path) -> Path:
+        return path.with_name(f".{path.name}.tmp")
+
+    @property
+    def paths(self):
+        return [self.path(suffix) for suffix in self.formats]
+
+    def __enter__(self):
+        for suffix in self.formats:
+            f = open(self._tmp_path(self.path(suffix)), 'w', encoding='utf-8')
+            self.files.append(f)
+            self.writers.append(FORMAT_CLASSES[suffix](f))
+        self._emit('begin', self.title)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc is not None:
+                # Close a table cut off mid-stream so the note lands outside it and the JSON stays valid
+                if self._table_open:
+                    self._emit('table_end')
+                    self._table_open = False
+                self._emit('text', f"Report incomplete: {type(exc).__name__}: {str(exc)}")
+            self._emit('end')
+        finally:
+            for f in self.files:
+                f.close()
+        for suffix in self.formats:
+            os.replace(self._tmp_path(self.path(suffix)), self.path(suffix))
+        return False
+
+    def _emit(self, method, *args):
+        for writer in self.writers:
+            getattr(writer, method)(*args)
+        self.flush()
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+    def heading(self, text: str, level: int = 2):
+        self._emit('heading', text, level)
+
+    def text(self, text: str):
+        self._emit('text', text)
+
+    def image(self, title: str, path: Union[str, Path]):
+        self._emit('image', title, path)
+
+    def stats(self, stats: dict):
+        self._emit('stats', stats)
+
+    def table(self, table: TableSource, columns=None):
+        """Write a frame, or an iterable of frame chunks, batch by batch"""
+        if columns is None and isinstance(table, pd.DataFrame):
+            columns = list(table.columns)
+        started = False
+        for chunk in iter_table_chunks(table):
+            if columns is None:
+                columns = list(chunk.columns)
+            if not started:
+                self._emit('table_start', columns)
+                self._table_open = started = True
+            rows = list(chunk[columns].itertuples(index=False, name=None))
+            self._emit('table_rows', rows)
+        if not started and columns is not None:
+            self._emit('table_start', columns)
+            self._table_open = started = True
+        if started:
+            self._emit('table_end')
+            self._table_open = False
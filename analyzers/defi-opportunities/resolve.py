@@ -0,0 +1,202 @@
+import logging
+import re
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from loader import apply_dtype_plan
+
+# Generic words that distinguish listings of one protocol across sources, not protocols
+NAME_STOPWORDS = {'finance', 'protocol', 'labs', 'dao', 'network', 'app', 'io', 'xyz', 'fi', 'the'}
+
+SHINGLE_SIZE = 3
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+# Names sharing a bucket larger than this are not paired: such buckets come from very short names
+LSH_MAX_BUCKET = 50
+# Minimum exact character n-gram Jaccard similarity for a candidate pair to be merged
+MATCH_THRESHOLD = 0.7
+# Names whose shingles are hashed per batch, bounding the (shingles x permutations) buffer
+MINHASH_BATCH_NAMES = 20_000
+
+# Universal hashing modulus; a, b and shingle ids are below it, so a * id + b fits in uint64
+_MERSENNE_PRIME = (1 << 31) - 1
+
+def name_key(name: str, strip_generic_words: bool = False) -> str:
+    """Lowercase, punctuation-free name; optionally without generic words: 'Marinade Finance' -> 'marinade'"""
+    tokens = re.sub(r'[^0-9a-z]+', ' ', str(name).lower()).split()
+    if not strip_generic_words:
+        return ' '.join(tokens)
+    kept = [token for token in tokens if token not in NAME_STOPWORDS]
+    return ' '.join(kept or tokens)
+
+def shingle_matrix(keys: np.ndarray) -> sparse.csr_matrix:
+    """Binary names x character n-gram matrix; names are padded so short names still shingle"""
+    rows, shingles = [], []
+    for row, key in enumerate(keys):
+        padded = f" {key} "
+        grams = {padded[start:start + SHINGLE_SIZE] for start in range(max(len(padded) - SHINGLE_SIZE + 1, 1))}
+        rows.extend([row] * len(grams))
+        shingles.extend(grams)
+    columns, _ = pd.factorize(pd.Series(shingles, dtype=object))
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, columns)),
+                               shape=(len(keys), int(columns.max()) + 1 if len(columns) else 0))
+    matrix.sort_indices()
+    return matrix
+
+def minhash_signatures(shingles: sparse.csr_matrix, permutations: int = MINHASH_PERMUTATIONS,
+                       seed: int = 0) -> np.ndarray:
+    """MinHash signature per row: the minimum of (a * shingle + b) mod p over its shingles, per permutation"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, permutations, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, permutations, dtype=np.uint64)
+    signatures = np.empty((shingles.shape[0], permutations), dtype=np.uint64)
+    for start in range(0, shingles.shape[0], MINHASH_BATCH_NAMES):
+        batch = shingles[start:start + MINHASH_BATCH_NAMES]
+        hashes = (batch.indices.astype(np.uint64)[:, None] * a + b) % np.uint64(_MERSENNE_PRIME)
+        # Every row has at least one shingle, so reduceat over row starts is a per-row minimum
+        signatures[start:start + batch.shape[0]] = np.minimum.reduceat(hashes, batch.indptr[:-1], axis=0)
+    return signatures
+
+def lsh_candidate_pairs(signatures: np.ndarray, bands: int = LSH_BANDS,
+                        max_bucket: int = LSH_MAX_BUCKET) -> Tuple[np.ndarray, np.ndarray]:
+    """(i, j) pairs with i < j that share at least one LSH band bucket"""
+    rows_per_band = signatures.shape[1] // bands
+    n = len(signatures)
+    # Odd multipliers mix a band's signature rows into one uint64 bucket key (wrapping is intended)
+    mixers = np.random.default_rng(1).integers(1, 1 << 62, rows_per_band, dtype=np.uint64) | np.uint64(1)
+    pair_codes = []
+    for band in range(bands):
+        with np.errstate(over='ignore'):
+            keys = signatures[:, band * rows_per_band:(band + 1) * rows_per_band] @ mixers
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        # Bucket sizes, to leave out oversized buckets entirely
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, n])
+        bucket_size = np.repeat(sizes, sizes)
+        eligible = bucket_size <= max_bucket
+        # Pair every member with the members 1, 2, ... places after it in the same bucket
+        for offset in range(1, int(sizes[sizes <= max_bucket].max(initial=1))):
+            same = (sorted_keys[offset:] == sorted_keys[:-offset]) & eligible[offset:]
+            first, second = order[:-offset][same], order[offset:][same]
+            pair_codes.append(np.minimum(first, second).astype(np.int64) * n + np.maximum(first, second))
+    if not pair_codes:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    codes = np.unique(np.concatenate(pair_codes))
+    return codes // n, codes % n
+
+def jaccard_pairs(shingles: sparse.csr_matrix, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Exact shingle Jaccard similarity for each candidate pair, without a Python loop over pairs"""
+    sizes = np.diff(shingles.indptr)
+    intersection = np.asarray(shingles[i].multiply(shingles[j]).sum(axis=1)).ravel()
+    return intersection / (sizes[i] + sizes[j] - intersection)
+
+def resolve_protocol_names(names: pd.Series, tvl: pd.Series = None, threshold: float = MATCH_THRESHOLD,
+                           groups: pd.Series = None, strip_generic_words: bool = False) -> pd.DataFrame:
+    """Map each distinct (group, protocol name) to a canonical name within its group.
+
+    Names with the same normalized key always merge; different keys merge when
+    LSH over their MinHash signatures makes them candidates, their exact n-gram
+    Jaccard similarity reaches threshold and they contain the same numbers. Names
+    only merge within a group (e.g. the category), and missing names are left out.
+    Each entity is named after its highest-TVL member.
+    """
+    valid = names.notna().to_numpy()
+    if not valid.any():
+        return pd.DataFrame(columns=['Group', 'Protocol', 'Canonical', 'Entity'])
+    group_codes, group_values = pd.factorize(groups[valid] if groups is not None else pd.Series(0, index=names.index[valid]),
+                                             use_na_sentinel=False)
+    frame = pd.DataFrame({'group': group_codes, 'name': names[valid].astype(str).to_numpy(),
+                          'tvl': 0.0 if tvl is None else tvl[valid].to_numpy(dtype=float)})
+    distinct = frame.groupby(['group', 'name'], sort=False)['tvl'].sum()
+    name_group = distinct.index.get_level_values('group').to_numpy()
+    name_values = distinct.index.get_level_values('name')
+
+    # A key is a normalized name within one group; only keys of the same group can merge
+    key_strings = name_values.map(lambda name: name_key(name, strip_generic_words))
+    key_codes, key_groups = pd.MultiIndex.from_arrays([name_group, key_strings]).factorize()
+    key_group = key_groups.get_level_values(0).to_numpy()
+    keys = key_groups.get_level_values(1)
+
+    shingles = shingle_matrix(np.asarray(keys))
+    i, j = lsh_candidate_pairs(minhash_signatures(shingles))
+    # Numbers usually tell listings apart ('Uniswap V2' vs 'V3'), so only keys with the same numbers merge
+    number_codes, _ = pd.factorize(keys.map(lambda key: ' '.join(re.findall(r'\d+', key))))
+    similar = (key_group[i] == key_group[j]) & (number_codes[i] == number_codes[j]) \
+        if len(i) else np.array([], dtype=bool)
+    similar[similar] = jaccard_pairs(shingles, i[similar], j[similar]) >= threshold
+    logging.info(f"Entity resolution: {len(distinct):,} names, {len(keys):,} keys, "
+                 f"{len(i):,} candidate pairs, {int(similar.sum()):,} matches")
+
+    graph = sparse.coo_matrix((np.ones(int(similar.sum())), (i[similar], j[similar])), shape=(len(keys), len(keys)))
+    _, key_entity = connected_components(graph, directed=False)
+    entity = key_entity[key_codes]
+
+    # Highest-TVL name of every entity becomes its canonical name (ties: first seen)
+    order = np.lexsort((np.arange(len(distinct)), -distinct.to_numpy(), entity))
+    first_of_entity = order[np.r_[True, entity[order][1:] != entity[order][:-1]]]
+    canonical = pd.Series(name_values[first_of_entity], index=entity[first_of_entity])
+    return pd.DataFrame({'Group': group_values[name_group], 'Protocol': name_values,
+                         'Canonical': canonical.loc[entity].to_numpy(), 'Entity': entity})
+
+def plan_protocol_merges(df: pd.DataFrame, threshold: float = MATCH_THRESHOLD,
+                         strip_generic_words: bool = False) -> pd.DataFrame:
+    """Renames merge_protocol_entities would make: category, protocol and its canonical name, per renamed name"""
+    mapping = resolve_protocol_names(df['protocol'], df['tvl'], threshold, groups=df['category'],
+                                     strip_generic_words=strip_generic_words)
+    renames = mapping.loc[mapping['Protocol'] != mapping['Canonical'], ['Group', 'Protocol', 'Canonical']]
+    return renames.rename(columns={'Group': 'Category'}).reset_index(drop=True)
+
+def merge_protocol_entities(df: pd.DataFrame, threshold: float = MATCH_THRESHOLD, tvl_aggregation: str = 'max',
+                            strip_generic_words: bool = False, plan: pd.DataFrame = None) -> pd.DataFrame:
+    """Collapse rows of the same protocol entity within a category into one row.
+
+    tvl_aggregation='max' suits the same protocol listed by several sources (summing
+    would count its TVL twice); 'sum' suits entities split into sub-listings. Other
+    columns come from the entity's highest-TVL row, except function, which keeps
+    every distinct fragment. Rows without a protocol name are kept as they are.
+    Pass a plan from plan_protocol_merges to apply renames already reviewed.
+    """
+    if tvl_aggregation not in ('max', 'sum'):
+        raise ValueError(f"tvl_aggregation must be 'max' or 'sum', got '{tvl_aggregation}'")
+    if plan is None:
+        plan = plan_protocol_merges(df, threshold, strip_generic_words)
+
+    df = df.reset_index(drop=True)
+    named = df[df['protocol'].notna()]
+    # Entity key: (category, canonical name); unrenamed names are their own canonical name
+    renamed = pd.MultiIndex.from_arrays([plan['Category'], plan['Protocol']])
+    rows = pd.MultiIndex.from_arrays([named['category'], named['protocol'].astype(str)])
+    position = renamed.get_indexer(rows)
+    canonical = named['protocol'].astype(str).to_numpy(dtype=object)
+    canonical[position >= 0] = plan['Canonical'].to_numpy(dtype=object)[position[position >= 0]]
+    entity, _ = pd.MultiIndex.from_arrays([named['category'], canonical]).factorize()
+
+    # Whole highest-TVL row per entity, so category, subcategory and tvl always come from one source row
+    by_tvl = np.lexsort((np.arange(len(named)), -named['tvl'].to_numpy(dtype=float, na_value=-np.inf), entity))
+    representative = by_tvl[np.r_[True, entity[by_tvl][1:] != entity[by_tvl][:-1]]] if len(named) else by_tvl
+    result = named.iloc[representative].copy()
+    result['protocol'] = canonical[representative]
+    tvl = pd.Series(named['tvl'].to_numpy(dtype=float, na_value=np.nan)).groupby(entity).agg(tvl_aggregation)
+    result['tvl'] = tvl.to_numpy()[entity[representative]]
+
+    if 'function' in named.columns:
+        duplicated = pd.Series(entity).duplicated(keep=False).to_numpy()
+        if duplicated.any():
+            fragments = pd.DataFrame({'entity': entity[duplicated],
+                                      'function': named['function'].to_numpy(dtype=object)[duplicated]}).dropna()
+            fragments = fragments.assign(function=fragments['function'].astype(str).str.split('\n')).explode('function')
+            fragments['function'] = fragments['function'].str.strip()
+            fragments = fragments[fragments['function'] != ''].drop_duplicates()
+            functions = fragments.groupby('entity', sort=False)['function'].agg('\n'.join)
+            merged_entity = pd.Series(entity[representative], index=result.index)
+            has_fragments = merged_entity.isin(functions.index)
+            result.loc[has_fragments, 'function'] = merged_entity[has_fragments].map(functions)
+
+    result = pd.concat([result, df[df['protocol'].isna()]]).sort_index()
+    logging.info(f"Merged {len(df):,} rows into {len(result):,} protocol entities")
+    return apply_dtype_plan(result.reset_index(drop=True))
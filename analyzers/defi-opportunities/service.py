@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from loader import load_dataset
+from opportunities import (DEFAULT_SCORER, analyze_composability, calculate_yield_potential,
+                           find_composability_opportunities, identify_top_protocols, score_yield_batch)
+from stats import generate_stats_report
+from sweep import OpportunitySweep
+from tvl_index import TVLIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_RESULTS = 256
+MAX_HEADER_BYTES = 16_384
+# Best pairs kept per (scorer, ordering) sweep; larger top_k queries are scored on demand
+SWEEP_MAX_PAIRS = 10_000
+
+# Endpoints answered by DatasetService._compute
+QUERY_ENDPOINTS = {'stats', 'top', 'range', 'percentile', 'composability', 'categories', 'opportunities'}
+
+def to_jsonable(value):
+    """Convert query results (frames, numpy scalars, tuples) into JSON-ready values; NaN and inf become None"""
+    if isinstance(value, pd.DataFrame):
+        return json.loads(value.to_json(orient='records'))
+    if isinstance(value, dict):
+        return {key: to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+class QueryError(Exception):
+    """Bad request parameters; reported to the client as HTTP 400"""
+
+class DatasetService:
+    """Keeps the cleaned dataset in memory and answers analyzer queries from it.
+
+    Results are cached per dataset version, concurrent identical queries share one
+    computation, and the source file is polled so a changed CSV is reloaded in
+    the background without blocking queries.
+    """
+
+    def __init__(self, csv_path: Path, poll_interval: float = 2.0, workers: int = 4):
+        self.csv_path      = Path(csv_path)
+        self.poll_interval = poll_interval
+        self.executor      = ThreadPoolExecutor(max_workers=workers)
+        self.data          = None
+        self.version       = 0
+        self._file_state   = None
+        self._cache        = OrderedDict()
+
+    def _stat(self):
+        stat = self.csv_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        """Load the dataset and the structures queries read from: composability and the TVL index"""
+        df = load_dataset(self.csv_path)
+        composability = calculate_yield_potential(analyze_composability(df))
+        composability['Category'] = composability['Category'].astype(str)
+        composability['Subcategory'] = composability['Subcategory'].astype(str)
+        return {
+            'df':            df,
+            'composability': composability,
+            'index':         TVLIndex(df),
+            # Scored pairs are built per (scorer, unordered) on first request, so reloads stay cheap
+            'sweeps':        {},
+            'sweeps_lock':   threading.Lock()
+        }
+
+    @staticmethod
+    def _opportunities(data: dict, threshold: float, scorer: str, top_k: int, unordered: bool):
+        composability = data['composability']
+        if top_k > SWEEP_MAX_PAIRS:
+            scored = composability.assign(Yield_Potential=score_yield_batch(composability, [scorer]).iloc[:, 0])
+            return find_composability_opportunities(scored, threshold, top_k=top_k, unordered=unordered)
+        with data['sweeps_lock']:
+            sweep = data['sweeps'].get((scorer, unordered))
+            if sweep is None:
+                sweep = OpportunitySweep(composability, [scorer], unordered=unordered, max_pairs=SWEEP_MAX_PAIRS)
+                data['sweeps'][(scorer, unordered)] = sweep
+        return sweep.select(threshold, scorer, top_k=top_k)
+
+    async def reload(self):
+        file_state = self._stat()
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(self.executor, self._load)
+        # Swap everything at once so queries never mix two dataset versions
+        self.data = data
+        self._file_state = file_state
+        self.version += 1
+        self._cache.clear()
+        logger.info(f"Loaded {len(data['df']):,} protocols from {self.csv_path} (version {self.version})")
+
+    async def watch(self):
+        """Reload whenever the source file's mtime or size changes"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if self._stat() != self._file_state:
+                    await self.reload()
+            except Exception as e:
+                logger.error(f"Reload of {self.csv_path} failed, still serving version {self.version}: {str(e)}")
+
+    def _compute(self, data: dict, endpoint: str, params: dict):
+        df, composability, index = data['df'], data['composability'], data['index']
+        group = {'category': params.get('category'), 'subcategory': params.get('subcategory')}
+        if endpoint == 'stats':
+            return generate_stats_report(df)
+        if endpoint == 'top':
+            if group['category'] is None and group['subcategory'] is None:
+                return identify_top_protocols(df, int(params.get('n', 5)), index)
+            return index.top(int(params.get('n', 5)), **group)[['protocol', 'category', 'subcategory', 'tvl']]
+        if endpoint == 'range':
+            low, high = float(params.get('low', 0)), float(params.get('high', 'inf'))
+            rows = index.between(low, high, **group)
+            return {'count': len(rows), 'total_tvl': index.sum_between(low, high, **group),
+                    'protocols': rows[['protocol', 'category', 'subcategory', 'tvl']]}
+        if endpoint == 'percentile':
+            return {'q': float(params.get('q', 50)), 'tvl': index.percentile(float(params.get('q', 50)), **group)}
+        if endpoint == 'composability':
+            return composability
+        if endpoint == 'categories':
+            breakdown = df.groupby('category', observed=True).agg(
+                Protocols=('protocol', 'count'), Total_TVL=('tvl', 'sum'), Median_TVL=('tvl', 'median')
+            ).reset_index().sort_values('Total_TVL', ascending=False)
+            breakdown['category'] = breakdown['category'].astype(str)
+            return breakdown
+        if endpoint == 'opportunities':
+            # Pairs are scored once per dataset version and scorer; each threshold is a prefix of the sorted scores
+            opportunities = self._opportunities(data, float(params.get('threshold', 0.5)),
+                                                params.get('scorer') or DEFAULT_SCORER, int(params.get('top_k', 100)),
+                                                params.get('unordered', '0') in ('1', 'true'))
+            return [dict(zip(['Category_1', 'Subcategory_1', 'Category_2', 'Subcategory_2', 'Synergy_Score'], opp))
+                    for opp in opportunities]
+        raise ValueError(f"unknown endpoint '{endpoint}'")
+
+    def _compute_json(self, version: int, data: dict, endpoint: str, params: dict) -> bytes:
+        try:
+            result = self._compute(data, endpoint, params)
+        except ValueError as e:
+            raise QueryError(str(e))
+        return json.dumps({'version': version, 'result': to_jsonable(result)}, allow_nan=False).encode()
+
+    async def query(self, endpoint: str, params: dict) -> bytes:
+        """JSON body for a query, computed on the thread pool at most once per dataset version"""
+        key = (self.version, endpoint, tuple(sorted(params.items())))
+        future = self._cache.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            # Bind the current version's data so a concurrent reload can't change it mid-query
+            future = loop.run_in_executor(self.executor, self._compute_json, self.version, self.data,
+                                          endpoint, params)
+            self._cache[key] = future
+            while len(self._cache) > MAX_CACHED_RESULTS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            # Never cache failures
+            self._cache.pop(key, None)
+            raise
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1 GET handler with keep-alive"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                headers = {name.strip().lower(): value.strip()
+                           for name, _, value in (line.partition(':') for line in header_lines if line)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                status, body = await self._respond(request_line)
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _respond(self, request_line: str):
+        try:
+            method, target, _ = request_line.split(' ', 2)
+        except ValueError:
+            return '400 Bad Request', b'{"error": "malformed request line"}'
+        if method != 'GET':
+            return '405 Method Not Allowed', b'{"error": "only GET is supported"}'
+
+        url = urlsplit(target)
+        endpoint = url.path.strip('/')
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if endpoint == 'health':
+            return '200 OK', json.dumps({'status': 'ok', 'version': self.version}).encode()
+        if endpoint not in QUERY_ENDPOINTS:
+            return '404 Not Found', json.dumps({'error': f"unknown endpoint '{endpoint}'"}).encode()
+        try:
+            return '200 OK', await self.query(endpoint, params)
+        except QueryError as e:
+            return '400 Bad Request', json.dumps({'error': str(e)}).encode()
+        except Exception as e:
+            logger.error(f"Query {endpoint} failed: {str(e)}")
+            return '500 Internal Server Error', json.dumps({'error': str(e)}).encode()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8080):
+        await self.reload()
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        watcher = asyncio.create_task(self.watch())
+        logger.info(f"Serving {self.csv_path} on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown(wait=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve analyzer queries over HTTP from an in-memory dataset')
+    parser.add_argument('csv', type=Path, nargs='?', default=Path('solana.csv'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between source file checks')
+    parser.add_argument('--workers', type=int, default=4, help='Threads for query computation')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    service = DatasetService(args.csv, args.poll_interval, args.workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
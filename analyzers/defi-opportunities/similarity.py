@@ -0,0 +1,149 @@
+import logging
+from typing import Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from function_analysis import classify_protocol_functions
+
+WEIGHTINGS = ('tfidf', 'tvl', 'binary')
+
+# Upper bound on similarity entries materialized per block of rows
+SIMILARITY_BLOCK_NNZ = 5_000_000
+
+class FunctionSimilarityIndex:
+    """Sparse protocol x function matrix with cosine top-k neighbour queries.
+
+    Rows are L2-normalized, so one sparse product gives cosine similarities. The
+    standardized vocabulary has only a handful of functions, so most protocols
+    share one and the all-pairs product is close to dense (O(n^2));
+    neighbour_table computes it one block of rows at a time to bound memory.
+    Many neighbours tie at 1.0, and ties are broken by higher TVL.
+    """
+
+    def __init__(self, functions_df: pd.DataFrame, weighting: str = 'tfidf', include_other: bool = False):
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f"Unknown weighting '{weighting}', expected one of {WEIGHTINGS}")
+        # Protocols whose fragments were all filtered out below still count as known
+        self.known_protocols = set(functions_df['Protocol'])
+        if not include_other:
+            # 'other' marks unrecognized fragments and would match unrelated protocols
+            functions_df = functions_df[functions_df['Function'] != 'other']
+
+        protocol_codes, self.protocols = pd.factorize(functions_df['Protocol'])
+        function_codes, self.functions = pd.factorize(functions_df['Function'])
+        self.protocol_ids = pd.Series(np.arange(len(self.protocols)), index=self.protocols)
+
+        per_protocol = functions_df.groupby('Protocol', sort=False, observed=True).agg(
+            Category=('Category', 'first'), TVL=('TVL', 'max')
+        ).reindex(self.protocols)
+        self.categories = per_protocol['Category'].to_numpy()
+        self.tvl = per_protocol['TVL'].to_numpy(dtype=float)
+
+        counts = sparse.csr_matrix(
+            (np.ones(len(protocol_codes)), (protocol_codes, function_codes)),
+            shape=(len(self.protocols), len(self.functions))
+        )
+        counts.sum_duplicates()
+        self.matrix = self._normalize(self._weight(counts, weighting))
+
+    def _weight(self, counts: sparse.csr_matrix, weighting: str) -> sparse.csr_matrix:
+        if weighting == 'binary':
+            return (counts > 0).astype(float).tocsr()
+        if weighting == 'tfidf':
+            document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+            idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+        else:
+            # TVL-weighted idf: functions that hold little of the total TVL are more distinctive
+            present = (counts > 0).astype(float)
+            tvl_mass = present.T @ np.maximum(self.tvl, 0)
+            idf = np.log((1 + self.tvl.clip(min=0).sum()) / (1 + tvl_mass)) + 1
+        return (counts @ sparse.diags(idf)).tocsr()
+
+    @staticmethod
+    def _normalize(matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+    def _top_k_rows(self, similarities: sparse.csr_matrix, rows: np.ndarray, k: int, exclude_same_category: bool):
+        """Top-k (neighbour, score) arrays for each row of a block of similarities"""
+        results = []
+        for offset, row in enumerate(rows):
+            start, end = similarities.indptr[offset], similarities.indptr[offset + 1]
+            neighbours = similarities.indices[start:end]
+            scores = similarities.data[start:end]
+            keep = neighbours != row
+            if exclude_same_category:
+                keep &= self.categories[neighbours] != self.categories[row]
+            neighbours, scores = neighbours[keep], scores[keep]
+            if k <= 0:
+                results.append((neighbours[:0], scores[:0]))
+                continue
+            if len(scores) > k:
+                # Keep everything tied with the k-th best score, so TVL decides among the ties
+                cutoff = np.partition(scores, len(scores) - k)[len(scores) - k]
+                tied = scores >= cutoff
+                neighbours, scores = neighbours[tied], scores[tied]
+            # Highest score first, higher TVL breaks ties
+            order = np.lexsort((-self.tvl[neighbours], -scores))[:k]
+            results.append((neighbours[order], scores[order]))
+        return results
+
+    def neighbours(self, protocol: str, k: int = 10, exclude_same_category: bool = False) -> pd.DataFrame:
+        """The k protocols whose function profile is most similar to protocol's"""
+        if protocol in self.protocol_ids.index:
+            row = self.protocol_ids[protocol]
+            similarities = (self.matrix[row] @ self.matrix.T).tocsr()
+            [(neighbours, scores)] = self._top_k_rows(similarities, np.array([row]), k, exclude_same_category)
+        elif protocol in self.known_protocols:
+            # No recognized function (only 'other'), so nothing to be similar to
+            neighbours, scores = np.array([], dtype=int), np.array([], dtype=float)
+        else:
+            raise KeyError(f"Unknown protocol {protocol}")
+        return pd.DataFrame({
+            'Protocol':   self.protocols[neighbours],
+            'Category':   self.categories[neighbours],
+            'TVL':        self.tvl[neighbours],
+            'Similarity': scores
+        })
+
+    def neighbour_table(self, k: int = 10, exclude_same_category: bool = False,
+                        block_size: int = None) -> pd.DataFrame:
+        """Top-k neighbours of every protocol, computed one block of rows at a time"""
+        n = self.matrix.shape[0]
+        transposed = self.matrix.T.tocsr()
+        if block_size is None:
+            # Estimate the product's density from the column frequencies to bound block memory
+            column_nnz = np.bincount(self.matrix.indices, minlength=self.matrix.shape[1])
+            nnz_per_row = max(1, int(column_nnz @ column_nnz / max(n, 1)))
+            block_size = max(1, SIMILARITY_BLOCK_NNZ // nnz_per_row)
+
+        sources, partners, ranks, scores = [], [], [], []
+        for start in range(0, n, block_size):
+            rows = np.arange(start, min(start + block_size, n))
+            similarities = (self.matrix[rows] @ transposed).tocsr()
+            for row, (neighbours, row_scores) in zip(rows, self._top_k_rows(similarities, rows, k, exclude_same_category)):
+                sources.append(np.full(len(neighbours), row))
+                partners.append(neighbours)
+                ranks.append(np.arange(1, len(neighbours) + 1))
+                scores.append(row_scores)
+            logging.debug(f"Scored similarity rows {start}-{rows[-1]}")
+        if not sources:
+            return pd.DataFrame(columns=['Protocol', 'Partner', 'Rank', 'Similarity'])
+        return pd.DataFrame({
+            'Protocol':   self.protocols[np.concatenate(sources)],
+            'Partner':    self.protocols[np.concatenate(partners)],
+            'Rank':       np.concatenate(ranks),
+            'Similarity': np.concatenate(scores)
+        })
+
+def build_similarity_index(data: Union[str, pd.DataFrame], weighting: str = 'tfidf') -> FunctionSimilarityIndex:
+    """Index a CSV path or loaded dataset by its standardized protocol functions"""
+    return FunctionSimilarityIndex(classify_protocol_functions(data), weighting)
+
+def find_composable_partners(data: Union[str, pd.DataFrame], protocol: str, k: int = 10,
+                             weighting: str = 'tfidf', exclude_same_category: bool = True) -> pd.DataFrame:
+    """Most composable partners of one protocol; by default only partners from other categories"""
+    return build_similarity_index(data, weighting).neighbours(protocol, k, exclude_same_category)
@@ -1,10 +1,24 @@
 import pandas as pd
 import numpy as np
-from scipy import stats
 import warnings
 import logging
+from pathlib import Path
+from report import ReportWriter
 warnings.filterwarnings('ignore')
 
+# Standardized TVL histogram bins: (lower edge, upper edge, label)
+TVL_BIN_RANGES = [
+    (0,      1e4,     '$0-10K'),
+    (1e4,    1e5,     '$10K-100K'),
+    (1e5,    1e6,     '$100K-1M'),
+    (1e6,    1e7,     '$1M-10M'),
+    (1e7,    1e8,     '$10M-100M'),
+    (1e8,    1e9,     '$100M-1B'),
+    (1e9,    1e10,    '$1B-10B'),
+    (1e10,   float('inf'), '$10B+')
+]
+TVL_BIN_EDGES = np.array([range[0] for range in TVL_BIN_RANGES] + [TVL_BIN_RANGES[-1][1]])
+
 def generate_stats_report(df):
     """Generate statistical analysis report from the DataFrame."""
     try:
@@ -30,15 +44,70 @@ def generate_stats_report(df):
         logging.error(f"Error occurred with data types: {df.dtypes}")
         raise
 
+# TVL percentiles and top-N share reported per group
+DISTRIBUTION_PERCENTILES = [50, 90, 99]
+TOP_SHARE_N = 5
+
+def grouped_distribution_stats(df, by='category'):
+    """Per-group TVL percentiles, HHI, Gini and top shares from one sort of the TVL column.
+
+    Groups become contiguous ascending segments after a single lexsort, and every
+    metric is a segmented reduction over them (np.add.reduceat and index
+    arithmetic), so the cost does not depend on the number of groups. HHI and
+    shares are fractions of the group's total TVL.
+    """
+    codes, groups = pd.factorize(df[by])
+    tvl = df['tvl'].to_numpy(dtype=float)
+    known = codes >= 0
+    codes, tvl = codes[known], tvl[known]
+
+    order = np.lexsort((tvl, codes))
+    values = tvl[order]
+    counts = np.bincount(codes, minlength=len(groups))
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    nonempty = counts > 0
+    starts, ends, counts, groups = starts[nonempty], ends[nonempty], counts[nonempty], np.asarray(groups)[nonempty]
+    if len(groups) == 0:
+        return pd.DataFrame(columns=['Level', 'Group', 'Protocols', 'Total_TVL']
+                            + [f'P{q}_TVL' for q in DISTRIBUTION_PERCENTILES]
+                            + ['HHI', 'Gini', 'Top1_Share', f'Top{TOP_SHARE_N}_Share'])
+
+    totals = np.add.reduceat(values, starts)
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    result = {'Level': by, 'Group': groups, 'Protocols': counts, 'Total_TVL': totals}
+
+    # Linear interpolation between order statistics, as in np.percentile
+    for q in DISTRIBUTION_PERCENTILES:
+        rank = (counts - 1) * q / 100
+        lower = np.floor(rank).astype(int)
+        upper = np.minimum(lower + 1, counts - 1)
+        result[f'P{q}_TVL'] = values[starts + lower] + (rank - lower) * (values[starts + upper] - values[starts + lower])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['HHI'] = np.add.reduceat(values ** 2, starts) / totals ** 2
+        # Gini of ascending x_1..x_n: 2 * sum(i * x_i) / (n * total) - (n + 1) / n
+        weighted = np.add.reduceat(values * np.arange(1, len(values) + 1), starts) - starts * totals
+        result['Gini'] = 2 * weighted / (counts * totals) - (counts + 1) / counts
+        result['Top1_Share'] = values[ends - 1] / totals
+        top_start = np.maximum(ends - TOP_SHARE_N, starts)
+        result[f'Top{TOP_SHARE_N}_Share'] = (cumulative[ends] - cumulative[top_start]) / totals
+
+    return pd.DataFrame(result).sort_values('Total_TVL', ascending=False, ignore_index=True)
+
+def generate_distribution_report(df, levels=('category', 'subcategory')):
+    """Tidy distribution and concentration stats for each grouping level, stacked"""
+    try:
+        return pd.concat([grouped_distribution_stats(df, level) for level in levels], ignore_index=True)
+    except Exception as e:
+        logging.error(f"An error occurred during distribution analysis: {str(e)}")
+        raise
+
 def write_stats_report(stats, output_file='defi_stats.md'):
-    """Write statistics to markdown file."""
-    with open(output_file, 'w') as f:
-        f.write('# DeFi Protocol Statistics\n\n')
-        
-        for key, value in stats.items():
-            if isinstance(value, float):
-                f.write(f'- **{key}:** {value:,.2f}\n')
-            elif isinstance(value, int):
-                f.write(f'- **{key}:** {value:,}\n')
-            else:
-                f.write(f'- **{key}:** {value}\n')
\ No newline at end of file
+    """Write statistics to output_file: HTML or JSON for .html/.json, markdown for any other name."""
+    output_file = Path(output_file)
+    suffix = output_file.suffix.lstrip('.')
+    report_format = suffix if suffix in ('html', 'json') else 'md'
+    with ReportWriter(output_file.with_suffix(''), 'DeFi Protocol Statistics', formats=(report_format,),
+                      output_paths={report_format: output_file}) as report:
+        report.stats(stats)
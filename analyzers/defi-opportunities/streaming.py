@@ -0,0 +1,279 @@
+import heapq
+import logging
+import math
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from loader import normalize_dataframe
+from stats import TVL_BIN_EDGES
+
+DEFAULT_CHUNKSIZE = 100_000
+
+ChunkSource = Union[str, Path, Callable[[], Iterable[pd.DataFrame]], Iterable[pd.DataFrame]]
+
+def iter_csv_chunks(csv_path: Union[str, Path], chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Read and normalize the CSV chunk by chunk"""
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        yield normalize_dataframe(chunk)
+
+class TVLSketch:
+    """Mergeable log-bucketed quantile sketch.
+
+    Positive values fall into buckets (gamma^(k-1), gamma^k], so any quantile is
+    estimated within a relative error of alpha. Values <= 0 share one bucket.
+    """
+
+    def __init__(self, alpha: float = 0.01):
+        self.alpha           = alpha
+        self.log_gamma       = math.log((1 + alpha) / (1 - alpha))
+        self.buckets         = Counter()
+        self.nonpositive     = 0
+        self.nonpositive_min = math.inf
+        self.nonpositive_max = -math.inf
+
+    @property
+    def count(self):
+        return self.nonpositive + sum(self.buckets.values())
+
+    @property
+    def positive_count(self):
+        return self.count - self.nonpositive
+
+    def bucket_keys(self, values: np.ndarray) -> np.ndarray:
+        """Bucket index of each positive value"""
+        return np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        nonpositive = values[values <= 0]
+        if len(nonpositive):
+            self.nonpositive += len(nonpositive)
+            self.nonpositive_min = min(self.nonpositive_min, nonpositive.min())
+            self.nonpositive_max = max(self.nonpositive_max, nonpositive.max())
+        keys, counts = np.unique(self.bucket_keys(values[values > 0]), return_counts=True)
+        self.buckets.update(dict(zip(keys.tolist(), counts.tolist())))
+
+    def merge(self, other: 'TVLSketch'):
+        self.buckets.update(other.buckets)
+        self.nonpositive += other.nonpositive
+        self.nonpositive_min = min(self.nonpositive_min, other.nonpositive_min)
+        self.nonpositive_max = max(self.nonpositive_max, other.nonpositive_max)
+
+    def locate(self, rank: int, positive_only: bool = False) -> Tuple[Union[int, None], int]:
+        """Bucket holding the value of the given 0-based rank and the rank inside that bucket.
+
+        The non-positive bucket is reported as None.
+        """
+        if not positive_only:
+            if rank < self.nonpositive:
+                return None, rank
+            rank -= self.nonpositive
+        for key in sorted(self.buckets):
+            if rank < self.buckets[key]:
+                return key, rank
+            rank -= self.buckets[key]
+        raise IndexError('rank outside of sketch')
+
+    def estimate(self, key: Union[int, None]) -> float:
+        """Representative value of a bucket"""
+        if key is None:
+            return self.nonpositive_max
+        gamma = math.exp(self.log_gamma)
+        return 2 * gamma ** key / (gamma + 1)
+
+    def median_ranks(self, positive_only: bool = False) -> List[int]:
+        n = self.positive_count if positive_only else self.count
+        return sorted({(n - 1) // 2, n // 2}) if n else []
+
+    def median(self, positive_only: bool = False) -> float:
+        """Median estimate within relative error alpha"""
+        ranks = self.median_ranks(positive_only)
+        if not ranks:
+            return float('nan')
+        values = [self.estimate(self.locate(rank, positive_only)[0]) for rank in ranks]
+        return sum(values) / len(values)
+
+def exact_medians(sketch: TVLSketch, chunks: Iterable[pd.DataFrame]) -> Tuple[float, float]:
+    """Second pass that turns the sketch's median buckets into exact medians.
+
+    Only values falling into the (at most four) buckets holding the middle ranks of
+    all TVL and of non-zero TVL are kept in memory. Returns (median, non-zero median).
+    """
+    targets = {}
+    for positive_only in (False, True):
+        for rank in sketch.median_ranks(positive_only):
+            key, offset = sketch.locate(rank, positive_only)
+            targets[(positive_only, rank)] = (key, offset)
+
+    wanted = {key for key, _ in targets.values()}
+    # A non-positive bucket holding a single distinct value needs no second look
+    constant_nonpositive = sketch.nonpositive_min == sketch.nonpositive_max
+    collect_nonpositive = None in wanted and not constant_nonpositive
+    positive_keys = np.array([key for key in wanted if key is not None], dtype=np.int64)
+
+    collected = {key: [] for key in wanted}
+    for chunk in chunks:
+        values = chunk['tvl'].to_numpy(dtype=float)
+        if collect_nonpositive:
+            collected[None].append(values[values <= 0])
+        positive = values[values > 0]
+        if len(positive_keys):
+            keys = sketch.bucket_keys(positive)
+            for key in positive_keys:
+                collected[int(key)].append(positive[keys == key])
+
+    sorted_buckets = {
+        key: np.sort(np.concatenate(parts)) if parts else np.array([])
+        for key, parts in collected.items()
+    }
+
+    def value_at(key, offset):
+        if key is None and constant_nonpositive:
+            return sketch.nonpositive_max
+        return sorted_buckets[key][offset]
+
+    medians = []
+    for positive_only in (False, True):
+        values = [value_at(*targets[(positive_only, rank)]) for rank in sketch.median_ranks(positive_only)]
+        medians.append(sum(values) / len(values) if values else float('nan'))
+    return medians[0], medians[1]
+
+class StreamingStats:
+    """Aggregates behind the stats report and charts, updated one chunk at a time"""
+
+    def __init__(self, top_n: int = 10, alpha: float = 0.01):
+        self.top_n           = top_n
+        self.count           = 0
+        self.tvl_sum         = 0.0
+        self.nonzero_count   = 0
+        self.nonzero_sum     = 0.0
+        self.sketch          = TVLSketch(alpha)
+        self.categories      = set()
+        self.subcategories   = set()
+        self.functions       = set()
+        self.category_counts = Counter()
+        self.histogram       = np.zeros(len(TVL_BIN_EDGES) - 1, dtype=np.int64)
+        self.median          = None
+        self.nonzero_median  = None
+        # Min-heap of (tvl, -row, protocol, category, subcategory); -row keeps the earliest row on ties
+        self._top            = []
+
+    def update(self, chunk: pd.DataFrame):
+        tvl = chunk['tvl'].to_numpy(dtype=float)
+        nonzero = tvl[tvl > 0]
+
+        self.count += len(tvl)
+        self.tvl_sum += tvl.sum()
+        self.nonzero_count += len(nonzero)
+        self.nonzero_sum += nonzero.sum()
+        self.sketch.update(tvl)
+        self.histogram += np.histogram(nonzero, bins=TVL_BIN_EDGES)[0]
+
+        self.categories.update(chunk['category'].dropna().unique())
+        self.subcategories.update(chunk['subcategory'].dropna().unique())
+        self.functions.update(chunk['function'].str.split('\n').explode().dropna().unique())
+        self.category_counts.update(chunk['category'].value_counts().to_dict())
+
+        # Only the chunk's own top-N can enter the overall top-N
+        first_row = self.count - len(tvl)
+        candidates = chunk.reset_index(drop=True).nlargest(self.top_n, 'tvl')
+        for row, record in zip(candidates.index, candidates.itertuples(index=False)):
+            item = (record.tvl, -(first_row + row), record.protocol, record.category, record.subcategory)
+            if len(self._top) < self.top_n:
+                heapq.heappush(self._top, item)
+            elif item > self._top[0]:
+                heapq.heapreplace(self._top, item)
+
+        # Medians must be recomputed once more data arrives
+        self.median = self.nonzero_median = None
+
+    def merge(self, other: 'StreamingStats'):
+        """Fold in the aggregates of another (disjoint) part of the data"""
+        offset = self.count
+        self.count += other.count
+        self.tvl_sum += other.tvl_sum
+        self.nonzero_count += other.nonzero_count
+        self.nonzero_sum += other.nonzero_sum
+        self.sketch.merge(other.sketch)
+        self.histogram += other.histogram
+        self.categories |= other.categories
+        self.subcategories |= other.subcategories
+        self.functions |= other.functions
+        self.category_counts.update(other.category_counts)
+        for tvl, row, *rest in other._top:
+            item = (tvl, row - offset, *rest)
+            if len(self._top) < self.top_n:
+                heapq.heappush(self._top, item)
+            elif item > self._top[0]:
+                heapq.heapreplace(self._top, item)
+        self.median = self.nonzero_median = None
+
+    def finalize_medians(self, chunks: Iterable[pd.DataFrame]):
+        """Make the medians exact with a second pass over the same chunks"""
+        self.median, self.nonzero_median = exact_medians(self.sketch, chunks)
+
+    def get_median(self, positive_only: bool = False) -> float:
+        exact = self.nonzero_median if positive_only else self.median
+        return exact if exact is not None else self.sketch.median(positive_only)
+
+    def report(self) -> dict:
+        """Same figures as stats.generate_stats_report"""
+        return {
+            'Total Protocols': self.count,
+            'Total TVL': self.tvl_sum,
+            'Average TVL': self.tvl_sum / self.count if self.count else float('nan'),
+            'Median TVL': self.get_median(),
+            'Categories': len(self.categories),
+            'Subcategories': len(self.subcategories),
+            'Functions': len(self.functions)
+        }
+
+    def top_protocols(self, n: int = None) -> pd.DataFrame:
+        """Highest-TVL protocols seen so far, best first"""
+        top = sorted(self._top, reverse=True)[:n]
+        return pd.DataFrame(
+            [(protocol, category, subcategory, tvl) for tvl, _, protocol, category, subcategory in top],
+            columns=['protocol', 'category', 'subcategory', 'tvl']
+        )
+
+    def category_counts_data(self) -> pd.Series:
+        counts = pd.Series(self.category_counts, name='count', dtype=np.int64)
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def tvl_histogram_data(self):
+        """Bin counts, count, median and mean of the non-zero TVL values"""
+        mean = self.nonzero_sum / self.nonzero_count if self.nonzero_count else float('nan')
+        return self.histogram, TVL_BIN_EDGES, self.nonzero_count, self.get_median(positive_only=True), mean
+
+def collect_streaming_stats(source: ChunkSource, chunksize: int = DEFAULT_CHUNKSIZE,
+                            exact_median: bool = True, top_n: int = 10, alpha: float = 0.01) -> StreamingStats:
+    """Aggregate a dataset that need not fit in memory.
+
+    source is a CSV path (read in chunks), a callable returning a fresh iterable of
+    normalized frames, or a one-shot iterable of frames. Medians are exact when the
+    source can be read twice and exact_median is set; otherwise they come from the
+    sketch with relative error alpha.
+    """
+    if isinstance(source, (str, Path)):
+        path = source
+        source = lambda: iter_csv_chunks(path, chunksize)
+
+    aggregates = StreamingStats(top_n=top_n, alpha=alpha)
+    rereadable = callable(source)
+    for chunk in (source() if rereadable else source):
+        aggregates.update(chunk)
+
+    if exact_median and rereadable:
+        aggregates.finalize_medians(source())
+    elif exact_median:
+        logging.warning("Source can only be read once; reporting sketched medians")
+    return aggregates
+
+def generate_stats_report_streaming(source: ChunkSource, chunksize: int = DEFAULT_CHUNKSIZE,
+                                    exact_median: bool = True) -> dict:
+    """Chunked equivalent of stats.generate_stats_report"""
+    return collect_streaming_stats(source, chunksize, exact_median).report()
@@ -0,0 +1,119 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from opportunities import PAIR_TILE_ELEMENTS, Scorers, _select_top, score_yield_batch
+
+class OpportunitySweep:
+    """Pair synergy scores computed once per yield scorer and sorted, for threshold sweeps.
+
+    Each scorer's pairs are kept best first, in the same order as
+    find_composability_opportunities, so the opportunities above any threshold are
+    a prefix found with one searchsorted. Pairs scoring at or below min_threshold
+    are dropped up front, and max_pairs keeps only each scorer's best pairs, to
+    bound memory on very large group counts.
+    """
+
+    def __init__(self, composability: pd.DataFrame, scorers: Scorers = None, unordered: bool = False,
+                 min_threshold: float = None, block_size: int = None, max_pairs: int = None):
+        self.composability = composability
+        self.unordered     = unordered
+        self.min_threshold = min_threshold
+        self.max_pairs     = max_pairs
+        self.yields        = score_yield_batch(composability, scorers)
+        self.scorers       = list(self.yields.columns)
+        self.categories    = composability['Category'].to_numpy(dtype=object)
+        self.subcategories = composability['Subcategory'].to_numpy(dtype=object)
+        self.pairs         = self._score_pairs(block_size)
+
+    def _score_pairs(self, block_size: int = None) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        yields = self.yields.to_numpy(dtype=float).T  # scorers x groups
+        total_tvl = self.composability['Total_TVL'].to_numpy(dtype=float)
+        n = len(total_tvl)
+        if block_size is None:
+            block_size = max(1, PAIR_TILE_ELEMENTS // max(n * len(self.scorers), 1))
+
+        columns = np.arange(n)
+        parts = {name: [] for name in self.scorers}
+        for start in range(0, n, block_size):
+            rows = np.arange(start, min(start + block_size, n))
+            # Every scorer's tile in one broadcast: scorers x rows x columns
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = (yields[:, rows, None] + yields[:, None, :]) / (total_tvl[rows, None] + total_tvl[None, :])
+            pair_mask = columns[None, :] > rows[:, None] if self.unordered else columns[None, :] != rows[:, None]
+            for s, name in enumerate(self.scorers):
+                mask = pair_mask & ~np.isnan(scores[s])
+                if self.min_threshold is not None:
+                    mask &= scores[s] > self.min_threshold
+                i, j = np.nonzero(mask)
+                parts[name].append((rows[i], j, scores[s][i, j]))
+                if self.max_pairs is not None:
+                    # Fold the tile into the running best max_pairs so memory stays bounded
+                    parts[name] = [_select_top(*map(np.concatenate, zip(*parts[name])), self.max_pairs)]
+
+        pairs = {}
+        for name, tiles in parts.items():
+            i, j, scores = (np.concatenate(values) for values in zip(*tiles)) if tiles \
+                else (np.array([], dtype=int), np.array([], dtype=int), np.array([], dtype=float))
+            order = np.lexsort((j, i, -scores))
+            # Negated scores ascend, which is what searchsorted needs
+            pairs[name] = (i[order], j[order], -scores[order])
+        return pairs
+
+    def _scorer(self, scorer: str = None) -> str:
+        scorer = scorer or self.scorers[0]
+        if scorer not in self.pairs:
+            raise ValueError(f"Scorer '{scorer}' is not part of this sweep, expected one of {self.scorers}")
+        return scorer
+
+    def _lowest_complete(self, scorer: str) -> float:
+        """Lowest threshold whose pairs are all kept; -inf unless max_pairs dropped some"""
+        neg_scores = self.pairs[scorer][2]
+        if self.max_pairs is None or len(neg_scores) < self.max_pairs:
+            return -np.inf
+        return -neg_scores[-1]
+
+    def _check_threshold(self, threshold: float, scorer: str, capped_ok: bool = False):
+        if self.min_threshold is not None and threshold < self.min_threshold:
+            raise ValueError(f"Threshold {threshold} is below the sweep's min_threshold {self.min_threshold}")
+        if not capped_ok and threshold < self._lowest_complete(scorer):
+            raise ValueError(f"Threshold {threshold} reaches past the sweep's best {self.max_pairs} pairs")
+
+    def count_above(self, thresholds: Sequence[float], scorer: str = None) -> np.ndarray:
+        """Number of pairs scoring strictly above each threshold"""
+        scorer = self._scorer(scorer)
+        thresholds = np.asarray(thresholds, dtype=float)
+        for threshold in np.atleast_1d(thresholds):
+            self._check_threshold(threshold, scorer)
+        _, _, neg_scores = self.pairs[scorer]
+        return np.searchsorted(neg_scores, -thresholds, side='left')
+
+    def select(self, threshold: float = 0.5, scorer: str = None, top_k: int = None) -> List[Tuple[str, str, str, str, float]]:
+        """Opportunities above threshold, best first, as returned by find_composability_opportunities
+
+        A sweep capped by max_pairs answers any threshold as long as top_k <= max_pairs.
+        """
+        scorer = self._scorer(scorer)
+        i, j, neg_scores = self.pairs[scorer]
+        # The kept pairs are the true best ones, so their first top_k above any threshold are exact
+        self._check_threshold(threshold, scorer,
+                              capped_ok=top_k is not None and self.max_pairs is not None and top_k <= self.max_pairs)
+        count = int(np.searchsorted(neg_scores, -threshold, side='left'))
+        if top_k is not None:
+            count = min(count, max(top_k, 0))
+        return [
+            (self.categories[a], self.subcategories[a], self.categories[b], self.subcategories[b], float(-score))
+            for a, b, score in zip(i[:count], j[:count], neg_scores[:count])
+        ]
+
+    def sweep_table(self, thresholds: Sequence[float]) -> pd.DataFrame:
+        """Opportunity count and best score above each threshold, for every scorer"""
+        rows = []
+        for name in self.scorers:
+            counts = self.count_above(thresholds, name)
+            best = -self.pairs[name][2][0] if len(self.pairs[name][2]) else np.nan
+            rows.extend({'Scorer': name, 'Threshold': threshold, 'Opportunities': int(count),
+                         'Best_Score': best if count else np.nan}
+                        for threshold, count in zip(thresholds, counts))
+        return pd.DataFrame(rows, columns=['Scorer', 'Threshold', 'Opportunities', 'Best_Score'])
@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from benchmark import generate_synthetic_dataset
+from loader import normalize_dataframe
+from resolve import merge_protocol_entities, plan_protocol_merges, resolve_protocol_names
+
+@pytest.fixture(scope='module')
+def dataset():
+    return normalize_dataframe(generate_synthetic_dataset(200, seed=1))
+
+def test_empty_names_resolve_to_empty_mapping():
+    for names in (pd.Series([], dtype=object), pd.Series([None, None], dtype=object)):
+        mapping = resolve_protocol_names(names)
+        assert mapping.empty
+        assert list(mapping.columns) == ['Group', 'Protocol', 'Canonical', 'Entity']
+
+def test_merge_empty_frame(dataset):
+    assert plan_protocol_merges(dataset.iloc[:0]).empty
+    merged = merge_protocol_entities(dataset.iloc[:0])
+    assert merged.empty
+    assert list(merged.columns) == list(dataset.columns)
+
+def test_merge_keeps_rows_without_names(dataset):
+    unnamed = dataset.head(5).copy()
+    unnamed['protocol'] = None
+    merged = merge_protocol_entities(unnamed)
+    assert len(merged) == 5
+    assert merged['protocol'].isna().all()
@@ -0,0 +1,23 @@
+import pytest
+
+from benchmark import generate_synthetic_dataset
+from loader import normalize_dataframe
+from opportunities import analyze_composability, calculate_yield_potential, find_composability_opportunities
+from sweep import OpportunitySweep
+
+@pytest.fixture(scope='module')
+def composability():
+    df = normalize_dataframe(generate_synthetic_dataset(2000, categories=10, subcategories=5, seed=1))
+    return calculate_yield_potential(analyze_composability(df))
+
+@pytest.mark.parametrize('max_pairs', [None, 50])
+@pytest.mark.parametrize('top_k', [-2, -1, 0])
+def test_select_non_positive_top_k_is_empty(composability, max_pairs, top_k):
+    sweep = OpportunitySweep(composability, max_pairs=max_pairs)
+    assert sweep.select(0.0, top_k=top_k) == []
+    assert find_composability_opportunities(composability, 0.0, top_k=top_k) == []
+
+@pytest.mark.parametrize('top_k', [1, 5, 50])
+def test_capped_select_matches_search(composability, top_k):
+    sweep = OpportunitySweep(composability, max_pairs=50)
+    assert sweep.select(0.0, top_k=top_k) == find_composability_opportunities(composability, 0.0, top_k=top_k)
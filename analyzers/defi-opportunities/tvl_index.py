@@ -0,0 +1,138 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from stats import TVL_BIN_EDGES
+
+# Columns with their own TVL-sorted segments
+INDEX_COLUMNS = ['category', 'subcategory']
+
+class _SortedSegments:
+    """TVL sorted descending within each group, stored as one array with group offsets"""
+
+    def __init__(self, tvl: np.ndarray, codes: np.ndarray, groups):
+        # lexsort is stable, so equal TVLs keep frame order like nlargest(keep='first')
+        order = np.lexsort((-tvl, codes))
+        sorted_codes = codes[order]
+        self.groups    = pd.Index(groups)
+        self.bounds    = np.searchsorted(sorted_codes, np.arange(len(self.groups) + 1))
+        self.positions = order
+        self.neg_tvl   = -tvl[order]
+        self.cumsum    = np.concatenate([[0.0], np.cumsum(tvl[order])])
+
+    def segment(self, group) -> Tuple[int, int]:
+        if group not in self.groups:
+            return 0, 0
+        code = self.groups.get_loc(group)
+        return self.bounds[code], self.bounds[code + 1]
+
+class TVLIndex:
+    """TVL-sorted positions over a loaded dataset, overall and per category and subcategory.
+
+    Built once per dataset; top-N, percentile, range and histogram queries are then
+    binary searches over the sorted arrays instead of scans of the frame. Queries
+    take either a category or a subcategory to restrict them to one group.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        tvl = df['tvl'].to_numpy(dtype=float)
+        self._levels = {None: _SortedSegments(tvl, np.zeros(len(tvl), dtype=np.intp), [None])}
+        for column in INDEX_COLUMNS:
+            if column not in df.columns:
+                continue
+            codes, groups = pd.factorize(df[column])
+            # Missing groups (code -1) sort before group 0 and fall outside every segment
+            self._levels[column] = _SortedSegments(tvl, codes, list(groups))
+
+    def _segment(self, category=None, subcategory=None):
+        if category is not None and subcategory is not None:
+            raise ValueError("Pass a category or a subcategory, not both")
+        if category is not None:
+            column, group = 'category', category
+        elif subcategory is not None:
+            column, group = 'subcategory', subcategory
+        else:
+            column, group = None, None
+        if column not in self._levels:
+            raise KeyError(f"TVL index was built without a '{column}' column")
+        level = self._levels[column]
+        start, end = level.segment(group)
+        return level, start, end
+
+    def _value_bounds(self, level, start, end, low, high):
+        """Slice of the segment holding low <= tvl <= high"""
+        keys = level.neg_tvl[start:end]
+        first = np.searchsorted(keys, -high, side='left')
+        last = np.searchsorted(keys, -low, side='right')
+        return start + first, start + last
+
+    def _rows(self, positions: np.ndarray) -> pd.DataFrame:
+        return self.df.iloc[positions]
+
+    def top(self, n: int = 10, category=None, subcategory=None) -> pd.DataFrame:
+        """The n rows with the highest TVL, in the same order as DataFrame.nlargest"""
+        level, start, end = self._segment(category, subcategory)
+        return self._rows(level.positions[start:min(end, start + max(n, 0))])
+
+    def count(self, category=None, subcategory=None) -> int:
+        _, start, end = self._segment(category, subcategory)
+        return end - start
+
+    def between(self, low: float, high: float, category=None, subcategory=None) -> pd.DataFrame:
+        """Rows with low <= TVL <= high, highest TVL first"""
+        level, start, end = self._segment(category, subcategory)
+        first, last = self._value_bounds(level, start, end, low, high)
+        return self._rows(level.positions[first:last])
+
+    def count_between(self, low: float, high: float, category=None, subcategory=None) -> int:
+        level, start, end = self._segment(category, subcategory)
+        first, last = self._value_bounds(level, start, end, low, high)
+        return last - first
+
+    def sum_between(self, low: float, high: float, category=None, subcategory=None) -> float:
+        level, start, end = self._segment(category, subcategory)
+        first, last = self._value_bounds(level, start, end, low, high)
+        return level.cumsum[last] - level.cumsum[first]
+
+    def percentile(self, q: float, category=None, subcategory=None, positive_only: bool = False) -> float:
+        """q-th percentile of TVL with numpy's default linear interpolation; NaN for an empty group"""
+        level, start, end = self._segment(category, subcategory)
+        if positive_only:
+            _, end = self._value_bounds(level, start, end, np.nextafter(0, 1), np.inf)
+        return self._percentile(level, start, end, q)
+
+    @staticmethod
+    def _percentile(level, start, end, q):
+        size = end - start
+        if size == 0:
+            return float('nan')
+        rank = (size - 1) * q / 100
+        lower = int(np.floor(rank))
+        upper = min(lower + 1, size - 1)
+        # Segments are sorted descending: ascending rank r sits at end - 1 - r
+        lower_value = -level.neg_tvl[end - 1 - lower]
+        upper_value = -level.neg_tvl[end - 1 - upper]
+        return float(lower_value + (rank - lower) * (upper_value - lower_value))
+
+    def histogram(self, edges: np.ndarray = TVL_BIN_EDGES, category=None, subcategory=None,
+                  positive_only: bool = True) -> np.ndarray:
+        """Bin counts matching np.histogram(tvl, edges); zero TVL is excluded by default"""
+        level, start, end = self._segment(category, subcategory)
+        if positive_only:
+            _, end = self._value_bounds(level, start, end, np.nextafter(0, 1), np.inf)
+        keys = level.neg_tvl[start:end]
+        # Bins are [a, b) except the last, which also includes its right edge
+        below = np.empty(len(edges), dtype=np.intp)
+        below[:-1] = np.searchsorted(keys, -np.asarray(edges[:-1]), side='right')
+        below[-1] = np.searchsorted(keys, -edges[-1], side='left')
+        return below[:-1] - below[1:]
+
+    def positive_summary(self, category=None, subcategory=None) -> Tuple[int, float, float]:
+        """Count, median and mean of the non-zero TVL values"""
+        level, start, end = self._segment(category, subcategory)
+        _, end = self._value_bounds(level, start, end, np.nextafter(0, 1), np.inf)
+        count = end - start
+        mean = (level.cumsum[end] - level.cumsum[start]) / count if count else float('nan')
+        return count, self._percentile(level, start, end, 50), mean